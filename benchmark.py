@@ -0,0 +1,258 @@
+import argparse
+import datetime
+import json
+import random
+import sys
+import time
+
+import thismightbeit as hotel
+
+# ======================================================
+# Benchmark Configuration
+# ======================================================
+
+# never seed into the live database
+BENCH_DATABASE = "mafwbh_inn_bench"
+ROOM_TYPES = [("single", 60.0), ("double", 95.0), ("suite", 180.0)]
+FIRST_NAMES = ["Ama", "Kofi", "Yaw", "Esi", "Kwame", "Abena", "Kojo", "Akua", "John", "Mary", "Ali", "Fatima", "Chen", "Maria", "Ivan", "Sara"]
+LAST_NAMES = ["Mensah", "Owusu", "Boateng", "Asante", "Smith", "Okafor", "Khan", "Garcia", "Ivanova", "Nkrumah", "Lee", "Adjei"]
+ITEMS = ["towel", "soap", "shampoo", "sheet", "pillow", "water", "coffee", "tea", "sugar", "tissue"]
+# tables the seed owns; everything else in the bench database is left alone
+SEEDED_TABLES = ["rooms", "customers", "bookings", "employees", "attendance", "payroll", "inventory",
+                 "inventory_usage", "service_orders", "invoices", "payments", "cancellations", "daily_revenue"]
+
+# ======================================================
+# Synthetic Hotel
+# ======================================================
+
+def seed(rng, rooms, customers, years, employees, items, usage_per_day):
+    today = datetime.date.today()
+    first_day = today - datetime.timedelta(days=int(years * 365))
+    with hotel.DB.transaction():
+        for table in SEEDED_TABLES:
+            hotel.DB.execute("DELETE FROM " + table)
+
+        room_rows = []
+        for i in range(rooms):
+            room_type, price = ROOM_TYPES[i % len(ROOM_TYPES)]
+            room_rows.append((str(100 + i), room_type, price, 'available'))
+        hotel.DB.executemany("INSERT INTO rooms (room_no, room_type, price, status) VALUES (%s,%s,%s,%s)", room_rows)
+        room_ids = [r['id'] for r in hotel.DB.execute("SELECT id FROM rooms ORDER BY id", fetchall=True)]
+        prices = dict((rid, ROOM_TYPES[i % len(ROOM_TYPES)][1]) for i, rid in enumerate(room_ids))
+
+        customer_rows = []
+        for i in range(customers):
+            first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+            customer_rows.append((first + " " + last, "0%09d" % rng.randrange(10 ** 9),
+                                  "%s.%s%d@example.com" % (first.lower(), last.lower(), i)))
+        hotel.DB.executemany("INSERT INTO customers (name, phone, email) VALUES (%s,%s,%s)", customer_rows)
+        first_customer = hotel.DB.execute("SELECT MIN(id) AS id FROM customers", fetchone=True)['id']
+
+        # back-to-back stays per room from first_day up to today, checked out
+        booking_rows = []
+        for rid in room_ids:
+            day = first_day + datetime.timedelta(days=rng.randrange(3))
+            while True:
+                nights = rng.randint(1, 7)
+                end = day + datetime.timedelta(days=nights)
+                if end >= today:
+                    break
+                booking_rows.append((first_customer + rng.randrange(customers), rid,
+                                     datetime.datetime(day.year, day.month, day.day, 14),
+                                     datetime.datetime(end.year, end.month, end.day, 11),
+                                     'checked_out', prices[rid] * nights))
+                day = end + datetime.timedelta(days=rng.randrange(4))
+        hotel.DB.executemany("INSERT INTO bookings (customer_id, room_id, check_in, check_out, status, total) "
+                             "VALUES (%s,%s,%s,%s,%s,%s)", booking_rows)
+
+        employee_rows = [("Staff %d" % i, rng.choice(["cleaner", "receptionist", "cook", "porter"]),
+                          "0%09d" % rng.randrange(10 ** 9), float(rng.randrange(800, 3000)), 'active')
+                         for i in range(employees)]
+        hotel.DB.executemany("INSERT INTO employees (name, role, phone, salary, status) VALUES (%s,%s,%s,%s,%s)", employee_rows)
+        employee_ids = [r['id'] for r in hotel.DB.execute("SELECT id FROM employees ORDER BY id", fetchall=True)]
+
+        attendance_rows = []
+        day = first_day
+        while day < today:
+            if day.weekday() < 6:
+                for eid in employee_ids:
+                    if rng.random() < 0.9:
+                        attendance_rows.append((eid, day, datetime.time(8, rng.randrange(30)), datetime.time(17, rng.randrange(30))))
+            day += datetime.timedelta(days=1)
+        hotel.DB.executemany("INSERT INTO attendance (employee_id, date, clock_in, clock_out) VALUES (%s,%s,%s,%s)", attendance_rows)
+
+        item_rows = [("%s %d" % (ITEMS[i % len(ITEMS)], i), rng.randrange(100, 10000)) for i in range(items)]
+        hotel.DB.executemany("INSERT INTO inventory (item, quantity) VALUES (%s,%s)", item_rows)
+        item_ids = [r['id'] for r in hotel.DB.execute("SELECT id FROM inventory ORDER BY id", fetchall=True)]
+
+        usage_rows = []
+        day = first_day
+        while day < today:
+            for _ in range(usage_per_day):
+                usage_rows.append((rng.choice(item_ids), rng.randint(1, 5),
+                                   datetime.datetime(day.year, day.month, day.day, rng.randrange(24), rng.randrange(60))))
+            day += datetime.timedelta(days=1)
+        hotel.DB.executemany("INSERT INTO inventory_usage (item_id, quantity, used_on) VALUES (%s,%s,%s)", usage_rows)
+
+    hotel.rebuild_daily_revenue()
+    hotel.REF_CACHE.invalidate('rooms')
+    hotel.AVAILABILITY.invalidate()
+    return {'rooms': len(room_rows), 'customers': len(customer_rows), 'bookings': len(booking_rows),
+            'employees': len(employee_rows), 'attendance': len(attendance_rows),
+            'inventory': len(item_rows), 'inventory_usage': len(usage_rows)}
+
+# ======================================================
+# Scenarios
+# ======================================================
+
+def timed(operations):
+    # operations: callables; returns per-call latencies in ms and the wall time
+    latencies = []
+    started = time.perf_counter()
+    for op in operations:
+        t = time.perf_counter()
+        op()
+        latencies.append((time.perf_counter() - t) * 1000.0)
+    return latencies, time.perf_counter() - started
+
+
+def summarize(latencies, wall):
+    ordered = sorted(latencies)
+    return {
+        'ops': len(ordered),
+        'ops_per_sec': round(len(ordered) / wall, 2) if wall else 0,
+        'mean_ms': round(sum(ordered) / len(ordered), 3) if ordered else 0,
+        'p50_ms': round(hotel.percentile(ordered, 50), 3),
+        'p95_ms': round(hotel.percentile(ordered, 95), 3),
+        'p99_ms': round(hotel.percentile(ordered, 99), 3),
+        'max_ms': round(ordered[-1], 3) if ordered else 0,
+    }
+
+
+def future_window(rng, horizon=180):
+    start = datetime.date.today() + datetime.timedelta(days=rng.randrange(1, horizon))
+    return start.isoformat(), (start + datetime.timedelta(days=rng.randint(1, 7))).isoformat()
+
+
+def run_scenarios(rng, iterations):
+    rooms = [r['id'] for r in hotel.DB.execute("SELECT id FROM rooms", fetchall=True)]
+    customers = hotel.DB.execute("SELECT MIN(id) AS lo, MAX(id) AS hi FROM customers", fetchone=True)
+    today = datetime.date.today()
+    results = {}
+
+    def availability():
+        start, end = future_window(rng)
+        hotel.is_room_available(rng.choice(rooms), start, end)
+
+    booked = []
+
+    def booking():
+        start, end = future_window(rng)
+        try:
+            booked.append(hotel.book_room(rng.randint(customers['lo'], customers['hi']), rng.choice(rooms), start, end).id)
+        except hotel.HotelError:
+            pass
+
+    def revenue():
+        start = today - datetime.timedelta(days=rng.randrange(1, 365))
+        hotel.revenue_by_room_type(start.isoformat(), (start + datetime.timedelta(days=rng.randrange(7, 90))).isoformat())
+
+    def search():
+        for _ in hotel.find_customers(rng.choice(FIRST_NAMES)[:3]):
+            pass
+
+    room_rows = list(hotel.REF_CACHE.rows('rooms').values())
+
+    def quotes():
+        start, end = future_window(rng)
+        hotel.quote_rooms(room_rows, start, end)
+
+    def payroll():
+        month = today - datetime.timedelta(days=rng.randrange(30, 330))
+        hotel.run_payroll(month.month, month.year, from_attendance=True)
+
+    results['is_room_available'] = summarize(*timed(availability for _ in range(iterations)))
+    results['create_booking_with_dates'] = summarize(*timed(booking for _ in range(iterations)))
+    results['create_booking_with_dates']['conflicts'] = iterations - len(booked)
+    results['check_out'] = summarize(*timed((lambda b=b: hotel.checkout(b)) for b in booked))
+    results['report_revenue'] = summarize(*timed(revenue for _ in range(iterations)))
+    results['search_customer_by_name'] = summarize(*timed(search for _ in range(iterations)))
+    results['quote_rooms'] = summarize(*timed(quotes for _ in range(iterations)))
+    # a full 365-night rebuild from bookings per call
+    results['forecast_rebuild'] = summarize(*timed(hotel.FORECAST.load for _ in range(max(1, iterations // 20))))
+    # a full month for every employee per call, so far fewer rounds
+    results['generate_payroll_from_attendance'] = summarize(*timed(payroll for _ in range(max(1, iterations // 20))))
+    return results
+
+
+def compare(previous, current):
+    print("%-34s %12s %12s %9s" % ("Scenario", "p50 before", "p50 now", "ops/s"))
+    for name, now in sorted(current['results'].items()):
+        before = previous.get('results', {}).get(name)
+        if not before:
+            print("%-34s %12s %12.3f %9.1f" % (name, "-", now['p50_ms'], now['ops_per_sec']))
+            continue
+        change = (now['ops_per_sec'] / before['ops_per_sec'] - 1) * 100 if before['ops_per_sec'] else 0
+        print("%-34s %12.3f %12.3f %+8.1f%%" % (name, before['p50_ms'], now['p50_ms'], change))
+
+# ======================================================
+# Command Line
+# ======================================================
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog="benchmark.py", description="seed a synthetic hotel and time the core operations")
+    parser.add_argument("--database", default=BENCH_DATABASE, help="scratch database to seed (default %(default)s)")
+    parser.add_argument("--rooms", type=int, default=200)
+    parser.add_argument("--customers", type=int, default=5000)
+    parser.add_argument("--years", type=float, default=2, help="years of booking / attendance / usage history")
+    parser.add_argument("--employees", type=int, default=50)
+    parser.add_argument("--items", type=int, default=100, help="inventory items")
+    parser.add_argument("--usage-per-day", type=int, default=20, help="inventory_usage rows per day of history")
+    parser.add_argument("--iterations", type=int, default=500, help="calls per scenario")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--no-seed", action="store_true", help="reuse the data from the previous run")
+    parser.add_argument("--label", default="", help="free text stored with the results, e.g. a commit id")
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--compare", metavar="JSON", help="earlier results file to compare against")
+    args = parser.parse_args(argv)
+
+    if args.database == hotel.DB_CONFIG['database']:
+        parser.error("refusing to seed the live database " + args.database)
+    # DB holds this same dict, and nothing has connected yet
+    hotel.DB_CONFIG['database'] = args.database
+    rng = random.Random(args.seed)
+    try:
+        hotel.initialize_database()
+        seeded, seed_seconds = None, 0.0
+        if not args.no_seed:
+            started = time.perf_counter()
+            seeded = seed(rng, args.rooms, args.customers, args.years, args.employees, args.items, args.usage_per_day)
+            seed_seconds = time.perf_counter() - started
+            print("Seeded in %.1f s:" % seed_seconds, seeded)
+        results = run_scenarios(rng, args.iterations)
+    finally:
+        hotel.LOG_WRITER.close()
+        hotel.DB.close_all()
+
+    report = {
+        'label': args.label,
+        'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+        'python': sys.version.split()[0],
+        'config': dict((k, v) for k, v in vars(args).items() if k not in ('output', 'compare', 'label')),
+        'seeded': seeded,
+        'seed_seconds': round(seed_seconds, 2),
+        'results': results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+    for name, r in sorted(results.items()):
+        print("%-34s %6d ops %9.1f ops/s  p50 %8.3f  p95 %8.3f  p99 %8.3f ms" % (
+            name, r['ops'], r['ops_per_sec'], r['p50_ms'], r['p95_ms'], r['p99_ms']))
+    print("Results written to", args.output)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), report)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,45 @@
+# Runs against a scratch MySQL database (never the live one); skipped when
+# mysql.connector is missing or no server is reachable.
+import pytest
+
+pytest.importorskip("mysql.connector")
+
+import thismightbeit as hotel
+
+TEST_DATABASE = "mafwbh_inn_test"
+
+
+@pytest.fixture(scope="module")
+def db():
+    live = hotel.DB_CONFIG['database']
+    hotel.DB_CONFIG['database'] = TEST_DATABASE
+    hotel.DB.close_all()
+    try:
+        if hotel.initialize_database(force=True) is None:
+            pytest.skip("no MySQL server for " + TEST_DATABASE)
+        yield hotel.DB
+    finally:
+        hotel.DB.close_all()
+        hotel.DB_CONFIG['database'] = live
+
+
+def new_invoice(amount):
+    rid = hotel.create_room("T%d" % int(amount * 100), "single", amount)
+    cid = hotel.create_customer("Test Guest", "0200000000", "guest@example.com")
+    booking = hotel.reserve_room(cid, rid)
+    return hotel.insert_row("INSERT INTO invoices (booking_id, amount, paid, status) VALUES (%s,%s,0,'unpaid')",
+                            (booking.id, amount))
+
+
+def test_full_payment_marks_invoice_paid(db):
+    iid = new_invoice(95.3)
+    inv = hotel.record_payment(iid, 95.3)
+    assert inv.status == 'paid'
+    row = db.execute("SELECT amount, paid, status FROM invoices WHERE id=%s", (iid,), fetchone=True)
+    assert row == {'amount': 95.3, 'paid': 95.3, 'status': 'paid'}
+
+
+def test_payment_in_parts_marks_invoice_paid_at_the_last(db):
+    iid = new_invoice(180.7)
+    assert hotel.record_payment(iid, 100.4).status == 'partial'
+    assert hotel.record_payment(iid, 80.3).status == 'paid'
@@ -4,9 +4,40 @@
 # Class XII Section A, DPS Panipat Refinery
 # Technology: Python 3 + MySQL (mysql.connector only)
 
+import argparse
+import atexit
+import bisect
+import csv
+import datetime
+import hashlib
+import heapq
+import json
+import math
+import os
+import queue
+import re
+import sys
+import threading
+import time
+from array import array
+from collections import Counter, OrderedDict, namedtuple
+from contextlib import contextmanager
+from itertools import accumulate
+
 import mysql.connector
 from mysql.connector import errorcode
 
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None  # only needed for Parquet exports
+
+try:
+    import numpy
+except ImportError:
+    numpy = None  # stay quotes fall back to plain Python loops
+
 # ======================================================
 # Database Configuration
 # ======================================================
@@ -48,9 +79,33 @@ def safe_float(msg):
 # Database Engine
 # ======================================================
 
+# connections kept open between queries; a checkout blocks once all are in use
+POOL_SIZE = 5
+# an idle connection released less than this many seconds ago is handed out
+# without a ping round trip
+PING_AFTER = 1.0
+# rows sent per multi-row INSERT by executemany
+BATCH_ROWS = 1000
+# server-side prepared statements kept per connection (least recently used go first)
+STMT_CACHE_SIZE = 64
+
+
 class Database:
-    def __init__(self, config):
+    def __init__(self, config, pool_size=POOL_SIZE):
         self.config = config
+        self.pool_size = pool_size
+        self.idle = []
+        self.opened = 0
+        self.lock = threading.Condition()
+        self.local = threading.local()
+        self.stats = {'checkouts': 0, 'waits': 0, 'handshakes': 0, 'handshakes_avoided': 0, 'reconnects': 0,
+                      'stmt_hits': 0, 'stmt_misses': 0, 'stmt_evictions': 0}
+        # id(conn) -> OrderedDict(sql -> (sql, prepared cursor))
+        self.statements = {}
+        # statements the server refused to prepare; these stay on the text protocol
+        self.unprepared = set()
+        # QueryProfiler while --profile is on
+        self.profiler = None
 
     def connect(self):
         try:
@@ -63,33 +118,510 @@ class Database:
             else:
                 raise RuntimeError(str(e))
 
-    def execute(self, query, params=None, fetchone=False, fetchall=False, commit=False):
-        conn = None
+    def acquire(self):
+        with self.lock:
+            self.stats['checkouts'] += 1
+            if not self.idle and self.opened >= self.pool_size:
+                self.stats['waits'] += 1
+                while not self.idle and self.opened >= self.pool_size:
+                    self.lock.wait()
+            if self.idle:
+                conn, released = self.idle.pop()
+            else:
+                conn, released = None, 0
+                self.opened += 1
+        if conn is not None:
+            try:
+                if time.monotonic() - released > PING_AFTER:
+                    conn.ping(reconnect=False)
+                with self.lock:
+                    self.stats['handshakes_avoided'] += 1
+                return conn
+            except Exception:
+                # dead connection (server restart, wait_timeout): replace it
+                self.close_quietly(conn)
+                with self.lock:
+                    self.stats['reconnects'] += 1
         try:
             conn = self.connect()
-            cur = conn.cursor(dictionary=True)
-            cur.execute(query, params or ())
-            result = None
-            if fetchone:
-                result = cur.fetchone()
-            if fetchall:
-                result = cur.fetchall()
+        except Exception:
+            with self.lock:
+                self.opened -= 1
+                self.lock.notify()
+            raise
+        with self.lock:
+            self.stats['handshakes'] += 1
+        return conn
+
+    def release(self, conn, discard=False):
+        if not discard:
+            try:
+                # never hand an open transaction (or read snapshot) to the next caller
+                if conn.in_transaction:
+                    conn.rollback()
+            except Exception:
+                discard = True
+        if discard:
+            self.close_quietly(conn)
+        with self.lock:
+            if discard:
+                self.opened -= 1
+            else:
+                self.idle.append((conn, time.monotonic()))
+            self.lock.notify()
+
+    def close_quietly(self, conn):
+        with self.lock:
+            self.statements.pop(id(conn), None)
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def close_all(self):
+        with self.lock:
+            idle, self.idle = self.idle, []
+            self.opened -= len(idle)
+        for conn, _ in idle:
+            self.close_quietly(conn)
+
+    def pool_stats(self):
+        with self.lock:
+            stats = dict(self.stats)
+            stats['open'] = self.opened
+            stats['idle'] = len(self.idle)
+            stats['stmt_cached'] = sum(len(c) for c in self.statements.values())
+        return stats
+
+    def statement(self, conn, query):
+        # prepared cursor for query on this connection. The cached text object is
+        # handed back too: the C extension only skips the re-prepare when it
+        # is passed the very same string it prepared.
+        with self.lock:
+            cache = self.statements.setdefault(id(conn), OrderedDict())
+            hit = cache.get(query)
+            if hit is not None:
+                cache.move_to_end(query)
+                self.stats['stmt_hits'] += 1
+                return hit
+            self.stats['stmt_misses'] += 1
+            evicted = None
+            if len(cache) >= STMT_CACHE_SIZE:
+                evicted = cache.popitem(last=False)[1][1]
+                self.stats['stmt_evictions'] += 1
+        if evicted is not None:
+            evicted.close()  # deallocates the statement on the server
+        hit = (query, conn.cursor(prepared=True))
+        with self.lock:
+            cache[query] = hit
+        return hit
+
+    def run_prepared(self, conn, query, params, fetchone, fetchall, rowcount):
+        text, cur = self.statement(conn, query)
+        try:
+            cur.execute(text, params)
+        except mysql.connector.Error as e:
+            if e.errno != errorcode.ER_UNSUPPORTED_PS:
+                raise
+            with self.lock:
+                self.statements.get(id(conn), {}).pop(query, None)
+                self.unprepared.add(query)
+            cur.close()
+            return self.run(conn, query, params, fetchone, fetchall, rowcount)
+        # the binary protocol leaves rows on the wire until read, so always
+        # drain them before the connection is used again
+        rows = []
+        if cur.description:
+            names = cur.column_names
+            rows = [dict(zip(names, r)) for r in cur.fetchall()]
+        result = None
+        if fetchone:
+            result = rows[0] if rows else None
+        if fetchall:
+            result = rows
+        if rowcount:
+            result = cur.rowcount
+        return result
+
+    def run(self, conn, query, params, fetchone, fetchall, rowcount=False):
+        if params and query not in self.unprepared:
+            return self.run_prepared(conn, query, params, fetchone, fetchall, rowcount)
+        cur = conn.cursor(dictionary=True, buffered=True)
+        cur.execute(query, params or ())
+        result = None
+        if fetchone:
+            result = cur.fetchone()
+        if fetchall:
+            result = cur.fetchall()
+        if rowcount:
+            result = cur.rowcount
+        cur.close()
+        return result
+
+    def execute(self, query, params=None, fetchone=False, fetchall=False, commit=False, rowcount=False):
+        started = time.perf_counter()
+        tx = getattr(self.local, 'conn', None)
+        if tx is not None:
+            # inside transaction(): share its connection, leave the commit to
+            # the end of the block and let errors reach it so it rolls back
+            try:
+                result = self.run(tx, query, params, fetchone, fetchall, rowcount)
+            except Exception as e:
+                raise RuntimeError("Database error: " + str(e))
+            if self.profiler:
+                self.profiler.record(profile_site(sys._getframe(1)), query, 0.0, time.perf_counter() - started, result)
+            return result
+        conn = None
+        try:
+            conn = self.acquire()
+            connected = time.perf_counter()
+            result = self.run(conn, query, params, fetchone, fetchall, rowcount)
             if commit:
                 conn.commit()
-            cur.close()
-            conn.close()
+            self.release(conn)
+            if self.profiler:
+                self.profiler.record(profile_site(sys._getframe(1)), query, connected - started, time.perf_counter() - connected, result)
             return result
         except Exception as e:
+            broken = False
             try:
                 if conn:
                     conn.rollback()
             except Exception:
-                pass
+                broken = True
+            if conn:
+                self.release(conn, discard=broken)
             print("Database error:", e)
             return None
 
+    def run_many(self, conn, query, rows):
+        cur = conn.cursor()
+        count = 0
+        for i in range(0, len(rows), BATCH_ROWS):
+            # mysql.connector rewrites INSERT ... VALUES into one multi-row insert
+            cur.executemany(query, rows[i:i + BATCH_ROWS])
+            count += cur.rowcount
+        cur.close()
+        return count
+
+    def executemany(self, query, rows, commit=False):
+        rows = list(rows)
+        if not rows:
+            return 0
+        started = time.perf_counter()
+        tx = getattr(self.local, 'conn', None)
+        if tx is not None:
+            try:
+                count = self.run_many(tx, query, rows)
+            except Exception as e:
+                raise RuntimeError("Database error: " + str(e))
+            if self.profiler:
+                self.profiler.record(profile_site(sys._getframe(1)), query, 0.0, time.perf_counter() - started, count)
+            return count
+        conn = None
+        try:
+            conn = self.acquire()
+            connected = time.perf_counter()
+            count = self.run_many(conn, query, rows)
+            if commit:
+                conn.commit()
+            self.release(conn)
+            if self.profiler:
+                self.profiler.record(profile_site(sys._getframe(1)), query, connected - started, time.perf_counter() - connected, count)
+            return count
+        except Exception as e:
+            broken = False
+            try:
+                if conn:
+                    conn.rollback()
+            except Exception:
+                broken = True
+            if conn:
+                self.release(conn, discard=broken)
+            print("Database error:", e)
+            return None
+
+    def iterate(self, query, params=None, batch_size=500, header=False, strict=False):
+        # Stream tuple rows through an unbuffered (server-side) cursor so at
+        # most batch_size rows are held in Python at once. Always runs on its
+        # own pooled connection, never on the transaction() one, because the
+        # connection is busy until the result has been read to the end.
+        # header=True yields the tuple of column names first; strict=True
+        # raises errors instead of printing them and ending the stream.
+        conn = None
+        done = False
+        # the profiler counts time spent in the driver only, not in the
+        # consumer between batches
+        profiler = self.profiler
+        site = profile_site(sys._getframe(1)) if profiler else None
+        connect_s = query_s = 0.0
+        count = 0
+        try:
+            started = time.perf_counter()
+            conn = self.acquire()
+            connected = time.perf_counter()
+            connect_s = connected - started
+            cur = conn.cursor()
+            cur.execute(query, params or ())
+            query_s += time.perf_counter() - connected
+            if header:
+                yield tuple(cur.column_names)
+            while True:
+                started = time.perf_counter()
+                rows = cur.fetchmany(batch_size)
+                query_s += time.perf_counter() - started
+                if not rows:
+                    break
+                count += len(rows)
+                for row in rows:
+                    yield row
+            cur.close()
+            done = True
+        except Exception as e:
+            if strict:
+                raise
+            print("Database error:", e)
+        finally:
+            if conn:
+                # a half-read result cannot be handed to the next caller
+                self.release(conn, discard=not done)
+            if profiler:
+                profiler.record(site, query, connect_s, query_s, count)
+
+    @contextmanager
+    def transaction(self):
+        # run every DB.execute in the block on one connection with one commit;
+        # an exception rolls the whole block back. Nested blocks join the outer one.
+        if getattr(self.local, 'conn', None) is not None:
+            yield self.local.conn
+            return
+        conn = self.acquire()
+        self.local.conn = conn
+        ok = False
+        try:
+            yield conn
+            conn.commit()
+            ok = True
+        finally:
+            self.local.conn = None
+            broken = False
+            if not ok:
+                try:
+                    conn.rollback()
+                except Exception:
+                    broken = True
+            self.release(conn, discard=broken)
+
 DB = Database(DB_CONFIG)
 
+# ======================================================
+# Query Profiling
+# ======================================================
+
+# statements at or above this many milliseconds go to SLOW_QUERY_LOG
+SLOW_QUERY_MS = 200.0
+SLOW_QUERY_LOG = "slow_queries.log"
+# every timed statement: call site, connect ms, query ms, rows (tab separated)
+QUERY_PROFILE_LOG = "query_profile.log"
+PROFILE_FLUSH_ROWS = 500
+
+
+class QueryProfiler:
+    # Off unless started (--profile or HOTEL_PROFILE=<slow ms>); while on,
+    # DB.execute / DB.executemany / DB.iterate time the pool checkout and the
+    # statement separately and note the function that issued them.
+    def __init__(self, slow_ms=SLOW_QUERY_MS):
+        self.slow_ms = slow_ms
+        self.lock = threading.Lock()
+        self.pending = []
+
+    def start(self, slow_ms=None):
+        if slow_ms is not None:
+            self.slow_ms = slow_ms
+        if DB.profiler is None:
+            DB.profiler = self
+            atexit.register(self.flush)
+
+    def record(self, site, query, connect_s, query_s, result):
+        if isinstance(result, list):
+            rows = len(result)
+        elif isinstance(result, dict):
+            rows = 1
+        elif isinstance(result, int):
+            rows = result
+        else:
+            rows = 0
+        connect_ms = connect_s * 1000.0
+        query_ms = query_s * 1000.0
+        with self.lock:
+            self.pending.append((site, connect_ms, query_ms, rows))
+            full = len(self.pending) >= PROFILE_FLUSH_ROWS
+            if connect_ms + query_ms >= self.slow_ms:
+                with open(SLOW_QUERY_LOG, "a") as f:
+                    f.write("%s\t%s\t%.1f ms (connect %.1f)\t%d rows\t%s\n" % (
+                        datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"), site,
+                        connect_ms + query_ms, connect_ms, rows, " ".join(query.split())))
+        if full:
+            self.flush()
+
+    def flush(self):
+        with self.lock:
+            pending, self.pending = self.pending, []
+            if pending:
+                with open(QUERY_PROFILE_LOG, "a") as f:
+                    for row in pending:
+                        f.write("%s\t%.3f\t%.3f\t%d\n" % row)
+
+# shared helpers (and comprehensions) that only pass a statement through; the
+# profiler charges it to the first caller outside them
+PROFILE_HELPERS = {'browse', 'insert_row', 'add_revenue', 'room_type_of_booking',
+                   'is_room_available', 'load', 'rows', 'get', '<genexpr>', '<listcomp>', '<dictcomp>'}
+
+
+def profile_site(frame):
+    while frame.f_back is not None and frame.f_globals is globals() and frame.f_code.co_name in PROFILE_HELPERS:
+        frame = frame.f_back
+    return frame.f_code.co_name
+
+
+QUERY_PROFILER = QueryProfiler()
+if os.environ.get("HOTEL_PROFILE"):
+    try:
+        QUERY_PROFILER.start(float(os.environ["HOTEL_PROFILE"]))
+    except ValueError:
+        print("Ignoring HOTEL_PROFILE=%r: expected the slow query threshold in ms" % os.environ["HOTEL_PROFILE"], file=sys.stderr)
+
+
+def percentile(ordered, pct):
+    # nearest rank on an already sorted list
+    if not ordered:
+        return 0.0
+    return ordered[max(0, int(math.ceil(pct / 100.0 * len(ordered))) - 1)]
+
+
+def print_query_stats(path=QUERY_PROFILE_LOG):
+    QUERY_PROFILER.flush()
+    sites = {}
+    try:
+        with open(path) as f:
+            for line in f:
+                parts = line.rstrip("\n").split("\t")
+                if len(parts) != 4:
+                    continue
+                s = sites.setdefault(parts[0], {'total': [], 'connect': 0.0, 'rows': 0})
+                s['total'].append(float(parts[1]) + float(parts[2]))
+                s['connect'] += float(parts[1])
+                s['rows'] += int(parts[3])
+    except IOError:
+        print("No query profile yet; run with --profile")
+        return
+    print("%-32s %7s %9s %9s %9s %11s %8s" % ("Call site", "Calls", "p50 ms", "p95 ms", "p99 ms", "connect ms", "rows"))
+    for site, s in sorted(sites.items(), key=lambda kv: -sum(kv[1]['total'])):
+        t = sorted(s['total'])
+        print("%-32s %7d %9.2f %9.2f %9.2f %11.2f %8.1f" % (
+            site, len(t), percentile(t, 50), percentile(t, 95), percentile(t, 99),
+            s['connect'] / len(t), float(s['rows']) / len(t)))
+
+# ======================================================
+# Paged Listings
+# ======================================================
+
+PAGE_SIZE = 20
+
+
+def browse(table, columns, where="", params=(), page_size=PAGE_SIZE):
+    # Keyset paging: each page seeks past the last id already shown
+    # (WHERE id > last ORDER BY id LIMIT n) on the primary key, so a page
+    # costs the same however much history sits in front of it.
+    cols = [c.strip() for c in columns.split(",")]
+    select = ", ".join(["id"] + [c for c in cols if c != "id"])
+    sql = "SELECT " + select + " FROM " + table + " WHERE id > %s"
+    if where:
+        sql += " AND (" + where + ")"
+    sql += " ORDER BY id LIMIT %s"
+    last_id = 0
+    while True:
+        rows = DB.execute(sql, (last_id,) + tuple(params) + (page_size,), fetchall=True) or []
+        for r in rows:
+            print(*[r[c] for c in cols])
+        if len(rows) < page_size:
+            return
+        last_id = rows[-1]['id']
+        if safe_input("-- Enter: next page, q: stop -- ").strip().lower() == 'q':
+            return
+
+# ======================================================
+# Reference Data Cache
+# ======================================================
+
+# Small, rarely written tables are read through this cache. Entries expire
+# after CACHE_TTL seconds (other desks may write too) and the add_* screens
+# invalidate their table straight away.
+CACHE_TTL = 300
+
+
+class ReferenceCache:
+    def __init__(self, tables, ttl=CACHE_TTL):
+        self.tables = tables
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.data = {}
+        self.hits = dict((t, 0) for t in tables)
+        self.misses = dict((t, 0) for t in tables)
+
+    def load(self, table):
+        # the cached {id: row} itself; only get() adds to it, under the lock
+        with self.lock:
+            entry = self.data.get(table)
+            if entry and time.monotonic() - entry[0] < self.ttl:
+                self.hits[table] += 1
+                return entry[1]
+            self.misses[table] += 1
+        rows = DB.execute(self.tables[table], fetchall=True)
+        if rows is None:
+            return {}
+        by_id = dict((r['id'], r) for r in rows)
+        with self.lock:
+            self.data[table] = (time.monotonic(), by_id)
+        return by_id
+
+    def rows(self, table):
+        # {id: row} for the whole table, as a copy callers may iterate or
+        # change while get() keeps filling the cached one
+        by_id = self.load(table)
+        with self.lock:
+            return dict(by_id)
+
+    def get(self, table, row_id):
+        # a row another desk added since the last load is fetched by id and
+        # kept, so a new id is not mistaken for a missing one
+        rows = self.load(table)
+        with self.lock:
+            row = rows.get(row_id)
+        if row is None and row_id is not None:
+            row = DB.execute(self.tables[table] + " WHERE id=%s", (row_id,), fetchone=True)
+            if row:
+                with self.lock:
+                    rows[row_id] = row
+        return row
+
+    def invalidate(self, table):
+        with self.lock:
+            self.data.pop(table, None)
+
+    def stats(self):
+        with self.lock:
+            return dict((t, (self.hits[t], self.misses[t])) for t in self.tables)
+
+
+REF_CACHE = ReferenceCache({
+    'services': "SELECT id, name, price FROM services",
+    'tax_rates': "SELECT id, name, rate FROM tax_rates",
+    # no status column: it changes with every booking
+    'rooms': "SELECT id, room_no, room_type, price FROM rooms",
+    'seasons': "SELECT id, name, start_day, end_day, factor FROM seasons",
+})
+
 # ======================================================
 # Database Schema
 # ======================================================
@@ -110,7 +642,47 @@ SCHEMA = [
 # Database Initialization
 # ======================================================
 
-def initialize_database():
+# Bump when an init_*_table helper changes. SCHEMA and MIGRATIONS are part of
+# the fingerprint already, so adding a migration needs no bump.
+SCHEMA_REVISION = 1
+
+
+def schema_fingerprint():
+    h = hashlib.sha1(str(SCHEMA_REVISION).encode())
+    for stmt in SCHEMA:
+        h.update(stmt.encode())
+    for version, description, statements in MIGRATIONS:
+        h.update(str(version).encode())
+        for stmt in statements:
+            if not callable(stmt):
+                h.update(stmt.encode())
+    return h.hexdigest()
+
+
+def schema_is_current():
+    # one round trip on a pooled connection that login() then reuses
+    try:
+        conn = DB.acquire()
+    except Exception:
+        return False
+    try:
+        cur = conn.cursor()
+        cur.execute("SELECT fingerprint FROM schema_meta WHERE id=1")
+        row = cur.fetchone()
+        cur.close()
+        return row is not None and row[0] == schema_fingerprint()
+    except Exception:
+        return False
+    finally:
+        DB.release(conn)
+
+
+def initialize_database(force=False):
+    started = time.perf_counter()
+    if not force and schema_is_current():
+        elapsed = (time.perf_counter() - started) * 1000
+        print("Database ready (warm start, %.1f ms)" % elapsed)
+        return elapsed
     try:
         base = mysql.connector.connect(host=DB_CONFIG['host'], user=DB_CONFIG['user'], password=DB_CONFIG['password'])
         cur = base.cursor()
@@ -119,8 +691,10 @@ def initialize_database():
         cur.close()
         base.close()
 
+        # run_ddl raises, so a failed step stops here before the fingerprint
+        # below marks the schema current
         for stmt in SCHEMA:
-            DB.execute(stmt, commit=True)
+            run_ddl(stmt)
 
         # core tables created above; now ensure all auxiliary tables also exist
         init_billing_tables()
@@ -131,16 +705,156 @@ def initialize_database():
         init_inventory_usage_table()
         init_vendor_tables()
         init_tax_table()
-
-        # default admin user
-        DB.execute(
-            "INSERT IGNORE INTO users (username,password,role) VALUES ('admin','admin','admin')",
-            commit=True,
-        )
-        print("Database initialized")
+        apply_migrations()
+
+        run_ddl("CREATE TABLE IF NOT EXISTS schema_meta (id INT PRIMARY KEY, fingerprint CHAR(40), updated_on DATETIME)")
+        with DB.transaction():
+            # default admin user
+            DB.execute("INSERT IGNORE INTO users (username,password,role) VALUES ('admin','admin','admin')")
+            DB.execute(
+                "INSERT INTO schema_meta VALUES (1,%s,NOW()) ON DUPLICATE KEY UPDATE fingerprint=VALUES(fingerprint), updated_on=NOW()",
+                (schema_fingerprint(),),
+            )
+        elapsed = (time.perf_counter() - started) * 1000
+        print("Database initialized (cold start, %.1f ms)" % elapsed)
+        return elapsed
     except Exception as e:
         print("Initialization error:", e)
 
+
+def benchmark_startup(runs=5):
+    cold = [initialize_database(force=True) or 0 for _ in range(runs)]
+    warm = [initialize_database() or 0 for _ in range(runs)]
+    print("Cold start avg: %.1f ms  Warm start avg: %.1f ms" % (sum(cold) / runs, sum(warm) / runs))
+
+# ======================================================
+# Schema Migrations (indexes & later table changes)
+# ======================================================
+
+# FLOAT columns holding money (and rates). Prepared statements read them
+# over the binary protocol as float32 widened to a double (95.3 comes back
+# as 95.30000305175781), so migration 6 makes them DOUBLE and rounds the
+# stored values back to the cent.
+MONEY_COLUMNS = [
+    ('rooms', 'price'), ('bookings', 'total'), ('employees', 'salary'), ('payroll', 'amount'),
+    ('services', 'price'), ('invoices', 'amount'), ('invoices', 'paid'), ('payments', 'amount'),
+    ('service_orders', 'total'), ('cancellations', 'refund'), ('purchase_orders', 'price'), ('tax_rates', 'rate'),
+]
+
+
+def round_money_columns():
+    with DB.transaction():
+        for table, column in MONEY_COLUMNS:
+            DB.execute("UPDATE %s SET %s=ROUND(%s, 2)" % (table, column, column))
+
+# (version, description, statements), applied in order exactly once each.
+# A step may also be a function, for backfills. The applied versions are
+# recorded in schema_version.
+MIGRATIONS = [
+    (1, "indexes for hot lookup columns", [
+        "CREATE INDEX idx_bookings_room_status_in ON bookings (room_id, status, check_in)",
+        "CREATE INDEX idx_bookings_status_total ON bookings (status, total)",
+        "CREATE INDEX idx_attendance_emp_date ON attendance (employee_id, date)",
+        "CREATE INDEX idx_inventory_quantity ON inventory (quantity)",
+        "CREATE INDEX idx_customers_name ON customers (name)",
+        "CREATE INDEX idx_rooms_type_status ON rooms (room_type, status)",
+        "CREATE INDEX idx_rooms_status ON rooms (status)",
+        "CREATE INDEX idx_invoices_booking ON invoices (booking_id)",
+        "CREATE INDEX idx_logs_time ON logs (log_time)",
+    ]),
+    (2, "daily revenue rollup", [
+        "ALTER TABLE service_orders ADD COLUMN ordered_on DATETIME",
+        "ALTER TABLE cancellations ADD COLUMN cancelled_on DATETIME",
+        "CREATE TABLE IF NOT EXISTS daily_revenue (day DATE, room_type VARCHAR(50), room_revenue DOUBLE DEFAULT 0, service_revenue DOUBLE DEFAULT 0, payments DOUBLE DEFAULT 0, refunds DOUBLE DEFAULT 0, PRIMARY KEY (day, room_type))",
+        lambda: rebuild_daily_revenue(),
+    ]),
+    (3, "service bill of materials", [
+        "CREATE TABLE IF NOT EXISTS service_inventory (service_id INT, item_id INT, quantity INT, PRIMARY KEY (service_id, item_id))",
+    ]),
+    (4, "table snapshot catalog", [
+        "CREATE TABLE IF NOT EXISTS snapshots (id INT AUTO_INCREMENT PRIMARY KEY, taken_on DATETIME, kind VARCHAR(12), base_id INT)",
+        "CREATE TABLE IF NOT EXISTS snapshot_tables (snapshot_id INT, table_name VARCHAR(64), shadow VARCHAR(64), row_count INT, complete TINYINT, PRIMARY KEY (snapshot_id, table_name))",
+        "CREATE TABLE IF NOT EXISTS snapshot_chunks (snapshot_id INT, table_name VARCHAR(64), chunk INT, row_count INT, crc BIGINT, stored TINYINT, PRIMARY KEY (snapshot_id, table_name, chunk))",
+    ]),
+    (5, "season calendar for pricing", [
+        "CREATE TABLE IF NOT EXISTS seasons (id INT AUTO_INCREMENT PRIMARY KEY, name VARCHAR(50), start_day DATE, end_day DATE, factor DOUBLE)",
+    ]),
+    (6, "money columns as DOUBLE", [
+        "ALTER TABLE %s MODIFY %s DOUBLE" % (table, column) for table, column in MONEY_COLUMNS
+    ] + [
+        lambda: round_money_columns(),
+    ]),
+]
+
+
+def run_ddl(stmt):
+    conn = DB.acquire()
+    try:
+        cur = conn.cursor()
+        cur.execute(stmt)
+        cur.close()
+    except mysql.connector.Error as e:
+        # DDL commits per statement, so a run interrupted halfway leaves some
+        # indexes/columns behind; finding them again is not an error
+        if e.errno not in (errorcode.ER_DUP_KEYNAME, errorcode.ER_DUP_FIELDNAME):
+            raise
+    finally:
+        DB.release(conn)
+
+
+def apply_migrations():
+    run_ddl("CREATE TABLE IF NOT EXISTS schema_version (version INT PRIMARY KEY, description VARCHAR(200), applied_on DATETIME)")
+    with DB.transaction():
+        done = set(r['version'] for r in DB.execute("SELECT version FROM schema_version", fetchall=True))
+    applied = 0
+    for version, description, statements in MIGRATIONS:
+        if version in done:
+            continue
+        for stmt in statements:
+            if callable(stmt):
+                stmt()
+            else:
+                run_ddl(stmt)
+        with DB.transaction():
+            DB.execute("INSERT INTO schema_version VALUES (%s,%s,NOW())", (version, description))
+        applied += 1
+    if applied:
+        print("Applied", applied, "schema migration(s)")
+    return applied
+
+
+# (label, query, params, index the query is expected to use)
+HOT_QUERIES = [
+    ("is_room_available", "SELECT * FROM bookings WHERE room_id=%s AND status IN ('reserved','checked_in') AND (check_in <= %s AND (check_out IS NULL OR check_out >= %s))", (1, '2024-01-02', '2024-01-01'), 'idx_bookings_room_status_in'),
+    ("revenue rollup rebuild", "SELECT SUM(total) AS r FROM bookings WHERE status='checked_out'", (), 'idx_bookings_status_total'),
+    ("report_revenue", "SELECT SUM(room_revenue) FROM daily_revenue WHERE day >= %s AND day <= %s", ('2024-01-01', '2024-12-31'), 'PRIMARY'),
+    ("attendance days", "SELECT COUNT(*) AS days FROM attendance WHERE employee_id=%s AND date>=%s AND date<%s", (1, '2024-01-01', '2024-02-01'), 'idx_attendance_emp_date'),
+    ("low_stock_report", "SELECT * FROM inventory WHERE quantity<=%s", (5,), 'idx_inventory_quantity'),
+    ("customer name prefix", "SELECT * FROM customers WHERE name LIKE %s", ('abc%',), 'idx_customers_name'),
+    ("rooms by type", "SELECT * FROM rooms WHERE room_type=%s", ('deluxe',), 'idx_rooms_type_status'),
+    ("available rooms", "SELECT * FROM rooms WHERE status='available'", (), 'idx_rooms_status'),
+    ("invoices by booking", "SELECT * FROM invoices WHERE booking_id=%s", (1,), 'idx_invoices_booking'),
+    ("logs by time", "SELECT * FROM logs WHERE log_time>=%s", ('2024-01-01',), 'idx_logs_time'),
+]
+
+
+def check_query_plans():
+    results = []
+    for label, query, params, index in HOT_QUERIES:
+        plan = DB.execute("EXPLAIN " + query, params, fetchone=True) or {}
+        results.append((label, index, plan.get('key'), plan.get('possible_keys')))
+    return results
+
+
+def print_query_plans():
+    # the optimizer may still prefer a scan on near-empty tables; an index that
+    # is not even among possible_keys means the query or the migration is wrong
+    for label, index, key, possible in check_query_plans():
+        if key == index:
+            print("OK  ", label, "->", key)
+        else:
+            print("MISS", label, "-> uses", key, "expected", index, "possible:", possible)
+
 # ======================================================
 # Authentication System
 # ======================================================
@@ -155,6 +869,7 @@ def login():
     user = DB.execute("SELECT * FROM users WHERE username=%s AND password=%s", (username, password), fetchone=True)
     if user:
         current_user = user
+        log_event("Login: " + username)
         return True
     print("Invalid credentials")
     return False
@@ -162,172 +877,370 @@ def login():
 
 def logout():
     global current_user
+    if current_user:
+        log_event("Logout: " + current_user['username'])
     current_user = None
+    LOG_WRITER.flush()
+
+# ======================================================
+# Operations & Results
+# ======================================================
+
+# Each desk action has an operation underneath it (create_room, book_room,
+# checkout, place_service_order, record_payment, ...) that takes plain
+# arguments, returns one of these tuples or a new id, and raises HotelError
+# for anything the clerk should be told. The menu functions only prompt,
+# call and print, so scripts, imports and load tests can call the same code.
+
+class HotelError(RuntimeError):
+    pass
+
+
+Booking = namedtuple('Booking', 'id customer_id room_id check_in check_out status')
+Bill = namedtuple('Bill', 'booking_id room_id room_type amount')
+ServiceOrder = namedtuple('ServiceOrder', 'booking_id service_id quantity total')
+Invoice = namedtuple('Invoice', 'id booking_id amount paid status')
+Cancellation = namedtuple('Cancellation', 'booking_id refund')
+RoomPage = namedtuple('RoomPage', 'rows total page pages')
+Quote = namedtuple('Quote', 'room_id room_type nights nightly total')
+
+
+def booking_of(row):
+    return Booking(row['id'], row['customer_id'], row['room_id'], row['check_in'], row['check_out'], row['status'])
+
+
+def invoice_of(row):
+    return Invoice(row['id'], row['booking_id'], row['amount'], row['paid'], row['status'])
+
+
+def insert_row(sql, params):
+    # LAST_INSERT_ID() is per connection, so ask on the one that inserted
+    with DB.transaction():
+        DB.execute(sql, params)
+        return DB.execute("SELECT LAST_INSERT_ID() AS id", fetchone=True)['id']
 
 # ======================================================
 # Room Management
 # ======================================================
 
+def create_room(room_no, room_type, price):
+    rid = insert_row("INSERT INTO rooms (room_no, room_type, price, status) VALUES (%s,%s,%s,%s)", (room_no, room_type, price, 'available'))
+    AVAILABILITY.invalidate()
+    FORECAST.invalidate()
+    REF_CACHE.invalidate('rooms')
+    return rid
+
+
 def add_room():
-    room_no = safe_input("Room number: ")
-    room_type = safe_input("Room type: ")
-    price = safe_float("Price: ")
-    DB.execute("INSERT INTO rooms (room_no, room_type, price, status) VALUES (%s,%s,%s,%s)", (room_no, room_type, price, 'available'), commit=True)
-    print("Room added")
+    try:
+        create_room(safe_input("Room number: "), safe_input("Room type: "), safe_float("Price: "))
+        print("Room added")
+    except Exception as e:
+        print("Room error:", e)
 
 
 def list_rooms():
-    rows = DB.execute("SELECT * FROM rooms", fetchall=True)
-    for r in rows or []:
-        print(r['id'], r['room_no'], r['room_type'], r['price'], r['status'])
+    browse("rooms", "id, room_no, room_type, price, status")
 
 # ======================================================
 # Customer Management
 # ======================================================
 
+def create_customer(name, phone, email):
+    cid = insert_row("INSERT INTO customers (name, phone, email) VALUES (%s,%s,%s)", (name, phone, email))
+    CUSTOMER_INDEX.add(cid, name, phone, email)
+    return cid
+
+
 def add_customer():
-    name = safe_input("Name: ")
-    phone = safe_input("Phone: ")
-    email = safe_input("Email: ")
-    DB.execute("INSERT INTO customers (name, phone, email) VALUES (%s,%s,%s)", (name, phone, email), commit=True)
-    print("Customer added")
+    try:
+        create_customer(safe_input("Name: "), safe_input("Phone: "), safe_input("Email: "))
+        print("Customer added")
+    except Exception as e:
+        print("Customer error:", e)
 
 
 def list_customers():
-    rows = DB.execute("SELECT * FROM customers", fetchall=True)
-    for c in rows or []:
-        print(c['id'], c['name'], c['phone'])
+    browse("customers", "id, name, phone")
 
 # ======================================================
 # Booking Management
 # ======================================================
 
+def reserve_room(cid, rid):
+    # open-ended booking starting now
+    with DB.transaction():
+        DB.execute("INSERT INTO bookings VALUES (NULL,%s,%s,NOW(),NULL,'reserved',0)", (cid, rid))
+        DB.execute("UPDATE rooms SET status='reserved' WHERE id=%s", (rid,))
+        b = DB.execute("SELECT * FROM bookings WHERE id=LAST_INSERT_ID()", fetchone=True)
+    booking_saved(b['id'], rid, b['check_in'], None)
+    AVAILABILITY.set_room_status(rid, 'reserved')
+    return booking_of(b)
+
+
 def create_booking():
     list_customers()
     cid = safe_int("Customer ID: ")
-    rows = DB.execute("SELECT * FROM rooms WHERE status='available'", fetchall=True)
-    for r in rows or []:
-        print(r['id'], r['room_no'], r['price'])
+    page_rooms(status='available')
     rid = safe_int("Room ID: ")
-    DB.execute("INSERT INTO bookings VALUES (NULL,%s,%s,NOW(),NULL,'reserved',0)", (cid, rid), commit=True)
-    DB.execute("UPDATE rooms SET status='reserved' WHERE id=%s", (rid,), commit=True)
-    print("Booking created")
+    try:
+        reserve_room(cid, rid)
+        print("Booking created")
+    except Exception as e:
+        print("Booking error:", e)
 
 
 def list_bookings():
-    rows = DB.execute("SELECT * FROM bookings", fetchall=True)
-    for b in rows or []:
-        print(b['id'], b['customer_id'], b['room_id'], b['status'])
+    browse("bookings", "id, customer_id, room_id, status")
+
+
+def checkin(bid):
+    with DB.transaction():
+        DB.execute("UPDATE bookings SET status='checked_in', check_in=NOW() WHERE id=%s", (bid,))
+        b = DB.execute("SELECT * FROM bookings WHERE id=%s", (bid,), fetchone=True)
+    if not b:
+        raise HotelError("Invalid booking")
+    booking_saved(bid, b['room_id'], b['check_in'], b['check_out'])
+    log_event("Check-in: booking " + str(bid))
+    return booking_of(b)
 
 
 def check_in():
     list_bookings()
-    bid = safe_int("Booking ID: ")
-    DB.execute("UPDATE bookings SET status='checked_in', check_in=NOW() WHERE id=%s", (bid,), commit=True)
-    print("Checked in")
+    try:
+        checkin(safe_int("Booking ID: "))
+        print("Checked in")
+    except HotelError as e:
+        print(e)
+    except Exception as e:
+        print("Check-in error:", e)
+
+
+def checkout(bid):
+    with DB.transaction():
+        booking = DB.execute("SELECT * FROM bookings WHERE id=%s FOR UPDATE", (bid,), fetchone=True)
+        if not booking:
+            raise HotelError("Invalid booking")
+        if booking['status'] not in ('reserved', 'checked_in'):
+            # already billed (or cancelled): billing again would count the stay twice
+            raise HotelError("Booking is " + str(booking['status']) + ", not open")
+        room = REF_CACHE.get('rooms', booking['room_id'])
+        if not room:
+            raise HotelError("Booking has no valid room")
+        # every night from check-in up to today, at that night's rate; a
+        # stay checked out on its check-in day is billed one night
+        check_in = to_datetime(booking['check_in'])
+        until = max(datetime.date.today(), check_in.date() + datetime.timedelta(days=1))
+        total = quote_rooms([room], check_in, until)[0].total
+        DB.execute("UPDATE bookings SET status='checked_out', check_out=NOW(), total=%s WHERE id=%s", (total, bid))
+        DB.execute("UPDATE rooms SET status='available' WHERE id=%s", (room['id'],))
+        add_revenue('room_revenue', total, room['room_type'])
+    booking_released(bid)
+    AVAILABILITY.set_room_status(room['id'], 'available')
+    log_event("Check-out: booking " + str(bid))
+    return Bill(bid, room['id'], room['room_type'], total)
 
 
 def check_out():
-    list_bookings()
-    bid = safe_int("Booking ID: ")
-    booking = DB.execute("SELECT * FROM bookings WHERE id=%s", (bid,), fetchone=True)
-    room = DB.execute("SELECT * FROM rooms WHERE id=%s", (booking['room_id'],), fetchone=True)
-    total = float(room['price'])
-    DB.execute("UPDATE bookings SET status='checked_out', check_out=NOW(), total=%s WHERE id=%s", (total, bid), commit=True)
-    DB.execute("UPDATE rooms SET status='available' WHERE id=%s", (room['id'],), commit=True)
-    print("Checked out. Bill:", total)
+    try:
+        list_bookings()
+        bill = checkout(safe_int("Booking ID: "))
+        print("Checked out. Bill:", bill.amount)
+    except HotelError as e:
+        print(e)
+    except Exception as e:
+        print("Check-out error:", e)
 
 # ======================================================
 # Employee Management
 # ======================================================
 
+def create_employee(name, role, phone, salary):
+    return insert_row("INSERT INTO employees VALUES (NULL,%s,%s,%s,%s,'active')", (name, role, phone, salary))
+
+
 def add_employee():
-    name = safe_input("Name: ")
-    role = safe_input("Role: ")
-    phone = safe_input("Phone: ")
-    salary = safe_float("Salary: ")
-    DB.execute("INSERT INTO employees VALUES (NULL,%s,%s,%s,%s,'active')", (name, role, phone, salary), commit=True)
-    print("Employee added")
+    try:
+        create_employee(safe_input("Name: "), safe_input("Role: "), safe_input("Phone: "), safe_float("Salary: "))
+        print("Employee added")
+    except Exception as e:
+        print("Employee error:", e)
 
 
 def list_employees():
-    rows = DB.execute("SELECT * FROM employees", fetchall=True)
-    for e in rows or []:
-        print(e['id'], e['name'], e['role'], e['salary'])
+    browse("employees", "id, name, role, salary")
 
 # ======================================================
 # Attendance & Payroll
 # ======================================================
 
+def clock_in(eid):
+    return insert_row("INSERT INTO attendance VALUES (NULL,%s,CURDATE(),CURTIME(),NULL)", (eid,))
+
+
+def clock_out(eid):
+    with DB.transaction():
+        changed = DB.execute("UPDATE attendance SET clock_out=CURTIME() WHERE employee_id=%s AND date=CURDATE() AND clock_out IS NULL", (eid,), rowcount=True)
+    if not changed:
+        raise HotelError("Employee has not clocked in today")
+    return changed
+
+
 def mark_attendance():
     list_employees()
-    eid = safe_int("Employee ID: ")
-    DB.execute("INSERT INTO attendance VALUES (NULL,%s,CURDATE(),CURTIME(),NULL)", (eid,), commit=True)
-    print("Clock in recorded")
+    try:
+        clock_in(safe_int("Employee ID: "))
+        print("Clock in recorded")
+    except Exception as e:
+        print("Attendance error:", e)
 
 
 def mark_departure():
-    eid = safe_int("Employee ID: ")
-    DB.execute("UPDATE attendance SET clock_out=CURTIME() WHERE employee_id=%s AND date=CURDATE()", (eid,), commit=True)
-    print("Clock out recorded")
+    try:
+        clock_out(safe_int("Employee ID: "))
+        print("Clock out recorded")
+    except HotelError as e:
+        print(e)
+    except Exception as e:
+        print("Attendance error:", e)
 
 
 def generate_payroll():
-    month = safe_int("Month: ")
-    year = safe_int("Year: ")
-    rows = DB.execute("SELECT * FROM employees WHERE status='active'", fetchall=True)
-    for e in rows or []:
-        DB.execute("INSERT INTO payroll VALUES (NULL,%s,%s,%s,%s)", (e['id'], month, year, e['salary']), commit=True)
-    print("Payroll generated")
+    try:
+        month = safe_int("Month: ")
+        year = safe_int("Year: ")
+        count = run_payroll(month, year)
+        print("Payroll generated for", count, "employees")
+    except Exception as e:
+        print("Payroll error:", e)
 
 
 def list_payroll():
-    rows = DB.execute("SELECT * FROM payroll", fetchall=True)
-    for p in rows or []:
-        print(p['employee_id'], p['month'], p['year'], p['amount'])
+    browse("payroll", "employee_id, month, year, amount")
 
 # ======================================================
 # Services & Inventory
 # ======================================================
 
+def create_service(name, price):
+    sid = insert_row("INSERT INTO services VALUES (NULL,%s,%s)", (name, price))
+    REF_CACHE.invalidate('services')
+    return sid
+
+
 def add_service():
-    name = safe_input("Service name: ")
-    price = safe_float("Price: ")
-    DB.execute("INSERT INTO services VALUES (NULL,%s,%s)", (name, price), commit=True)
-    print("Service added")
+    try:
+        create_service(safe_input("Service name: "), safe_float("Price: "))
+        print("Service added")
+    except Exception as e:
+        print("Service error:", e)
 
 
 def list_services():
-    rows = DB.execute("SELECT * FROM services", fetchall=True)
-    for s in rows or []:
+    for s in REF_CACHE.rows('services').values():
         print(s['id'], s['name'], s['price'])
 
 
+def create_inventory_item(item, qty):
+    return insert_row("INSERT INTO inventory VALUES (NULL,%s,%s)", (item, qty))
+
+
 def add_inventory():
-    item = safe_input("Item: ")
-    qty = safe_int("Quantity: ")
-    DB.execute("INSERT INTO inventory VALUES (NULL,%s,%s)", (item, qty), commit=True)
-    print("Inventory item added")
+    try:
+        create_inventory_item(safe_input("Item: "), safe_int("Quantity: "))
+        print("Inventory item added")
+    except Exception as e:
+        print("Inventory error:", e)
 
 
 def list_inventory():
-    rows = DB.execute("SELECT * FROM inventory", fetchall=True)
-    for i in rows or []:
-        print(i['id'], i['item'], i['quantity'])
+    browse("inventory", "id, item, quantity")
 
 # ======================================================
 # Reports
 # ======================================================
 
 def report_occupancy():
-    total = DB.execute("SELECT COUNT(*) AS c FROM rooms", fetchone=True)['c']
-    occ = DB.execute("SELECT COUNT(*) AS c FROM rooms WHERE status!='available'", fetchone=True)['c']
+    row = DB.execute("SELECT COUNT(*) AS c, SUM(status!='available') AS occ FROM rooms", fetchone=True)
+    total, occ = row['c'], row['occ'] or 0
     print("Occupancy:", (occ / total * 100) if total else 0)
 
 
 def report_revenue():
-    rev = DB.execute("SELECT SUM(total) AS r FROM bookings WHERE status='checked_out'", fetchone=True)['r']
-    print("Total revenue:", rev)
+    try:
+        start = safe_input("From (YYYY-MM-DD, blank for all): ").strip()
+        end = safe_input("To (YYYY-MM-DD, blank for all): ").strip()
+        rows = revenue_by_room_type(start, end)
+        for r in rows:
+            print(r['room_type'] or '-', "rooms:", r['room'], "services:", r['service'], "payments:", r['paid'], "refunds:", r['refunds'])
+        print("Total revenue:", sum(r['room'] or 0 for r in rows))
+    except Exception as e:
+        print("Revenue report error:", e)
+
+# ======================================================
+# Daily Revenue Rollup
+# ======================================================
+
+# daily_revenue holds one row per (day, room_type). check_out, order_service,
+# pay_invoice and cancel_booking_advanced add to it inside their own
+# transaction, so revenue reports read a few hundred rollup rows instead of
+# scanning bookings / service_orders history.
+
+def add_revenue(column, amount, room_type, day=None):
+    # day=None means today on the server clock, the same clock NOW() uses
+    sql = ("INSERT INTO daily_revenue (day, room_type, " + column + ") VALUES (COALESCE(%s, CURDATE()),%s,%s) "
+           "ON DUPLICATE KEY UPDATE " + column + "=" + column + "+VALUES(" + column + ")")
+    DB.execute(sql, (day, room_type or '', amount), commit=True)
+
+
+def room_type_of_booking(booking_id):
+    b = DB.execute("SELECT room_id FROM bookings WHERE id=%s", (booking_id,), fetchone=True)
+    room = REF_CACHE.get('rooms', b['room_id']) if b else None
+    return room['room_type'] if room else ''
+
+
+def rebuild_daily_revenue():
+    # backfill from raw history; rows without their own timestamp are dated
+    # by their booking
+    with DB.transaction():
+        DB.execute("DELETE FROM daily_revenue")
+        DB.execute(
+            "INSERT INTO daily_revenue (day, room_type, room_revenue) "
+            "SELECT COALESCE(DATE(b.check_out), DATE(b.check_in), CURDATE()), COALESCE(r.room_type,''), SUM(b.total) "
+            "FROM bookings b LEFT JOIN rooms r ON r.id=b.room_id WHERE b.status='checked_out' GROUP BY 1, 2")
+        DB.execute(
+            "INSERT INTO daily_revenue (day, room_type, service_revenue) "
+            "SELECT COALESCE(DATE(so.ordered_on), DATE(b.check_out), DATE(b.check_in), CURDATE()), COALESCE(r.room_type,''), SUM(so.total) "
+            "FROM service_orders so LEFT JOIN bookings b ON b.id=so.booking_id LEFT JOIN rooms r ON r.id=b.room_id GROUP BY 1, 2 "
+            "ON DUPLICATE KEY UPDATE service_revenue=VALUES(service_revenue)")
+        DB.execute(
+            "INSERT INTO daily_revenue (day, room_type, payments) "
+            "SELECT COALESCE(DATE(p.pay_time), CURDATE()), COALESCE(r.room_type,''), SUM(p.amount) "
+            "FROM payments p LEFT JOIN invoices i ON i.id=p.invoice_id LEFT JOIN bookings b ON b.id=i.booking_id "
+            "LEFT JOIN rooms r ON r.id=b.room_id GROUP BY 1, 2 "
+            "ON DUPLICATE KEY UPDATE payments=VALUES(payments)")
+        DB.execute(
+            "INSERT INTO daily_revenue (day, room_type, refunds) "
+            "SELECT COALESCE(DATE(c.cancelled_on), DATE(b.check_in), CURDATE()), COALESCE(r.room_type,''), SUM(c.refund) "
+            "FROM cancellations c LEFT JOIN bookings b ON b.id=c.booking_id LEFT JOIN rooms r ON r.id=b.room_id GROUP BY 1, 2 "
+            "ON DUPLICATE KEY UPDATE refunds=VALUES(refunds)")
+        row = DB.execute("SELECT COUNT(*) AS c FROM daily_revenue", fetchone=True)
+    return row['c']
+
+
+def revenue_by_room_type(start=None, end=None):
+    sql = ("SELECT room_type, SUM(room_revenue) AS room, SUM(service_revenue) AS service, "
+           "SUM(payments) AS paid, SUM(refunds) AS refunds FROM daily_revenue "
+           "WHERE day >= COALESCE(%s, '1000-01-01') AND day <= COALESCE(%s, '9999-12-31') "
+           "GROUP BY room_type ORDER BY room_type")
+    return DB.execute(sql, (start or None, end or None), fetchall=True) or []
+
+
+def rebuild_revenue_rollup():
+    try:
+        print("Rollup rebuilt:", rebuild_daily_revenue(), "day/room-type rows")
+    except Exception as e:
+        print("Rollup rebuild error:", e)
 
 # ======================================================
 # Menus
@@ -359,11 +1272,13 @@ def employee_menu():
 
 def service_menu():
     while True:
-        print("1.Add 2.List 3.Back")
+        print("1.Add 2.List 3.Add Component 4.List Components 5.Back")
         c = safe_input("Choice: ")
         if c == '1': add_service()
         elif c == '2': list_services()
-        elif c == '3': break
+        elif c == '3': add_service_component()
+        elif c == '4': list_service_components()
+        elif c == '5': break
 
 
 def inventory_menu():
@@ -377,11 +1292,14 @@ def inventory_menu():
 
 def report_menu():
     while True:
-        print("1.Occupancy 2.Revenue 3.Back")
+        print("1.Occupancy 2.Revenue 3.Dashboard 4.Watch Dashboard 5.Rebuild Revenue Rollup 6.Back")
         c = safe_input("Choice: ")
         if c == '1': report_occupancy()
         elif c == '2': report_revenue()
-        elif c == '3': break
+        elif c == '3': report_dashboard()
+        elif c == '4': report_dashboard(watch=True)
+        elif c == '5': rebuild_revenue_rollup()
+        elif c == '6': break
 
 # ======================================================
 # Billing & Payments System
@@ -389,48 +1307,56 @@ def report_menu():
 
 # Invoices table extension (safe to call multiple times)
 def init_billing_tables():
-    try:
-        DB.execute("CREATE TABLE IF NOT EXISTS invoices (id INT AUTO_INCREMENT PRIMARY KEY, booking_id INT, amount FLOAT, paid FLOAT, status VARCHAR(20))", commit=True)
-        DB.execute("CREATE TABLE IF NOT EXISTS payments (id INT AUTO_INCREMENT PRIMARY KEY, invoice_id INT, amount FLOAT, pay_time DATETIME)", commit=True)
-    except Exception as e:
-        print("Billing table error:", e)
+    run_ddl("CREATE TABLE IF NOT EXISTS invoices (id INT AUTO_INCREMENT PRIMARY KEY, booking_id INT, amount FLOAT, paid FLOAT, status VARCHAR(20))")
+    run_ddl("CREATE TABLE IF NOT EXISTS payments (id INT AUTO_INCREMENT PRIMARY KEY, invoice_id INT, amount FLOAT, pay_time DATETIME)")
 
 
-def create_invoice():
-    try:
-        list_bookings()
-        bid = safe_int("Booking ID: ")
+def invoice_booking(bid):
+    with DB.transaction():
         booking = DB.execute("SELECT * FROM bookings WHERE id=%s", (bid,), fetchone=True)
         if not booking:
-            print("Invalid booking")
-            return
+            raise HotelError("Invalid booking")
         amt = booking['total'] if booking['total'] else 0
-        DB.execute("INSERT INTO invoices VALUES (NULL,%s,%s,0,'unpaid')", (bid, amt), commit=True)
+        iid = insert_row("INSERT INTO invoices VALUES (NULL,%s,%s,0,'unpaid')", (bid, amt))
+    return Invoice(iid, bid, amt, 0, 'unpaid')
+
+
+def create_invoice():
+    try:
+        list_bookings()
+        invoice_booking(safe_int("Booking ID: "))
         print("Invoice created")
+    except HotelError as e:
+        print(e)
     except Exception as e:
         print("Invoice error:", e)
 
 
 def list_invoices():
-    rows = DB.execute("SELECT * FROM invoices", fetchall=True)
-    for i in rows or []:
-        print(i['id'], i['booking_id'], i['amount'], i['paid'], i['status'])
+    browse("invoices", "id, booking_id, amount, paid, status")
+
+
+def record_payment(iid, amt):
+    # returns the invoice as it stands after the payment
+    with DB.transaction():
+        inv = DB.execute("SELECT * FROM invoices WHERE id=%s FOR UPDATE", (iid,), fetchone=True)
+        if not inv:
+            raise HotelError("Invalid invoice")
+        new_paid = round(inv['paid'] + amt, 2)
+        status = 'paid' if new_paid >= round(inv['amount'], 2) else 'partial'
+        DB.execute("UPDATE invoices SET paid=%s,status=%s WHERE id=%s", (new_paid, status, iid))
+        DB.execute("INSERT INTO payments VALUES (NULL,%s,%s,NOW())", (iid, amt))
+        add_revenue('payments', amt, room_type_of_booking(inv['booking_id']))
+    return Invoice(iid, inv['booking_id'], inv['amount'], new_paid, status)
 
 
 def pay_invoice():
     try:
         list_invoices()
-        iid = safe_int("Invoice ID: ")
-        amt = safe_float("Pay amount: ")
-        inv = DB.execute("SELECT * FROM invoices WHERE id=%s", (iid,), fetchone=True)
-        if not inv:
-            print("Invalid invoice")
-            return
-        new_paid = inv['paid'] + amt
-        status = 'paid' if new_paid >= inv['amount'] else 'partial'
-        DB.execute("UPDATE invoices SET paid=%s,status=%s WHERE id=%s", (new_paid, status, iid), commit=True)
-        DB.execute("INSERT INTO payments VALUES (NULL,%s,%s,NOW())", (iid, amt), commit=True)
+        record_payment(safe_int("Invoice ID: "), safe_float("Pay amount: "))
         print("Payment recorded")
+    except HotelError as e:
+        print(e)
     except Exception as e:
         print("Payment error:", e)
 
@@ -439,10 +1365,19 @@ def pay_invoice():
 # ======================================================
 
 def init_service_orders_table():
-    try:
-        DB.execute("CREATE TABLE IF NOT EXISTS service_orders (id INT AUTO_INCREMENT PRIMARY KEY, booking_id INT, service_id INT, quantity INT, total FLOAT)", commit=True)
-    except Exception as e:
-        print("Service order table error:", e)
+    run_ddl("CREATE TABLE IF NOT EXISTS service_orders (id INT AUTO_INCREMENT PRIMARY KEY, booking_id INT, service_id INT, quantity INT, total FLOAT)")
+
+
+def place_service_order(bid, sid, qty):
+    service = REF_CACHE.get('services', sid)
+    if not service or qty <= 0:
+        raise HotelError("Invalid service")
+    total = service['price'] * qty
+    with DB.transaction():
+        DB.execute("INSERT INTO service_orders (booking_id, service_id, quantity, total, ordered_on) VALUES (%s,%s,%s,%s,NOW())", (bid, sid, qty, total))
+        add_revenue('service_revenue', total, room_type_of_booking(bid))
+        deduct_inventory_for_service(sid, qty)
+    return ServiceOrder(bid, sid, qty, total)
 
 
 def order_service():
@@ -451,47 +1386,51 @@ def order_service():
         bid = safe_int("Booking ID: ")
         list_services()
         sid = safe_int("Service ID: ")
-        qty = safe_int("Quantity: ")
-        service = DB.execute("SELECT * FROM services WHERE id=%s", (sid,), fetchone=True)
-        if not service:
-            print("Invalid service")
-            return
-        total = service['price'] * qty
-        DB.execute("INSERT INTO service_orders VALUES (NULL,%s,%s,%s,%s)", (bid, sid, qty, total), commit=True)
-        print("Service ordered. Cost:", total)
+        order = place_service_order(bid, sid, safe_int("Quantity: "))
+        print("Service ordered. Cost:", order.total)
+    except HotelError as e:
+        print(e)
     except Exception as e:
         print("Service order error:", e)
 
 
 def list_service_orders():
-    rows = DB.execute("SELECT * FROM service_orders", fetchall=True)
-    for o in rows or []:
-        print(o['booking_id'], o['service_id'], o['quantity'], o['total'])
+    browse("service_orders", "booking_id, service_id, quantity, total")
 
 # ======================================================
 # Booking Cancellation & Refunds
 # ======================================================
 
 def init_cancellation_table():
-    try:
-        DB.execute("CREATE TABLE IF NOT EXISTS cancellations (id INT AUTO_INCREMENT PRIMARY KEY, booking_id INT, reason TEXT, refund FLOAT)", commit=True)
-    except Exception as e:
-        print("Cancellation table error:", e)
+    run_ddl("CREATE TABLE IF NOT EXISTS cancellations (id INT AUTO_INCREMENT PRIMARY KEY, booking_id INT, reason TEXT, refund FLOAT)")
+
+
+def cancel_booking(bid, reason):
+    with DB.transaction():
+        booking = DB.execute("SELECT * FROM bookings WHERE id=%s FOR UPDATE", (bid,), fetchone=True)
+        if not booking:
+            raise HotelError("Invalid booking")
+        refund = (booking['total'] or 0) * 0.8
+        DB.execute("INSERT INTO cancellations (booking_id, reason, refund, cancelled_on) VALUES (%s,%s,%s,NOW())", (bid, reason, refund))
+        DB.execute("UPDATE bookings SET status='cancelled' WHERE id=%s", (bid,))
+        room_type = room_type_of_booking(bid)
+        if booking['status'] == 'checked_out':
+            # no longer counted as room revenue, same as the old SUM over checked_out bookings
+            checked_out_on = to_datetime(booking['check_out'])
+            add_revenue('room_revenue', -(booking['total'] or 0), room_type, checked_out_on and checked_out_on.date())
+        add_revenue('refunds', refund, room_type)
+    booking_released(bid)
+    return Cancellation(bid, refund)
 
 
 def cancel_booking_advanced():
     try:
         list_bookings()
         bid = safe_int("Booking ID: ")
-        reason = safe_input("Reason: ")
-        booking = DB.execute("SELECT * FROM bookings WHERE id=%s", (bid,), fetchone=True)
-        if not booking:
-            print("Invalid booking")
-            return
-        refund = (booking['total'] or 0) * 0.8
-        DB.execute("INSERT INTO cancellations VALUES (NULL,%s,%s,%s)", (bid, reason, refund), commit=True)
-        DB.execute("UPDATE bookings SET status='cancelled' WHERE id=%s", (bid,), commit=True)
-        print("Booking cancelled. Refund:", refund)
+        cancelled = cancel_booking(bid, safe_input("Reason: "))
+        print("Booking cancelled. Refund:", cancelled.refund)
+    except HotelError as e:
+        print(e)
     except Exception as e:
         print("Cancellation error:", e)
 
@@ -499,6 +1438,12 @@ def cancel_booking_advanced():
 # User Management (Admin)
 # ======================================================
 
+def create_user(username, password, role):
+    if role not in ROLE_PERMISSIONS:
+        raise HotelError("Unknown role: " + str(role))
+    return insert_row("INSERT INTO users (username,password,role) VALUES (%s,%s,%s)", (username, password, role))
+
+
 def add_user():
     try:
         u = safe_input("Username: ")
@@ -508,39 +1453,144 @@ def add_user():
         if r not in ROLE_PERMISSIONS:
             print("Invalid role, defaulting to 'staff'")
             r = "staff"
-        DB.execute("INSERT INTO users (username,password,role) VALUES (%s,%s,%s)", (u, p, r), commit=True)
+        create_user(u, p, r)
         print("User added with role:", r)
+    except HotelError as e:
+        print(e)
     except Exception as e:
         print("User error:", e)
 
 
 def list_users():
-    rows = DB.execute("SELECT * FROM users", fetchall=True)
-    for u in rows or []:
-        print(u['id'], u['username'])
+    browse("users", "id, username")
 
 # ======================================================
 # Activity Logs (Simple)
 # ======================================================
 
 def init_logs_table():
-    try:
-        DB.execute("CREATE TABLE IF NOT EXISTS logs (id INT AUTO_INCREMENT PRIMARY KEY, message TEXT, log_time DATETIME)", commit=True)
-    except Exception as e:
-        print("Log table error:", e)
+    run_ddl("CREATE TABLE IF NOT EXISTS logs (id INT AUTO_INCREMENT PRIMARY KEY, message TEXT, log_time DATETIME)")
+
+
+# Log rows are written by a background thread in multi-row INSERTs once
+# LOG_BATCH rows are waiting or LOG_FLUSH_SECONDS have passed. When
+# LOG_QUEUE_SIZE rows are already waiting, new events are dropped (and
+# counted) instead of blocking the desk.
+LOG_QUEUE_SIZE = 10000
+LOG_BATCH = 200
+LOG_FLUSH_SECONDS = 2.0
+
+
+class LogWriter:
+    def __init__(self, query):
+        self.query = query
+        self.queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+        self.lock = threading.Lock()
+        self.thread = None
+        self.stopping = False
+        self.dropped = 0
+        self.written = 0
+        self.failed = 0
+        self.batches = 0
+
+    def start(self):
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.stopping = False
+                self.thread = threading.Thread(target=self.run, name="log-writer", daemon=True)
+                self.thread.start()
+
+    def submit(self, row):
+        self.start()
+        try:
+            self.queue.put_nowait(row)
+        except queue.Full:
+            with self.lock:
+                self.dropped += 1
+
+    def write(self, rows):
+        try:
+            count = DB.executemany(self.query, rows, commit=True)
+        except Exception:
+            count = None
+        with self.lock:
+            if count is None:
+                self.failed += len(rows)
+            else:
+                self.written += len(rows)
+                self.batches += 1
+        for _ in rows:
+            self.queue.task_done()
+
+    def run(self):
+        while not self.stopping:
+            try:
+                rows = [self.queue.get(timeout=LOG_FLUSH_SECONDS)]
+            except queue.Empty:
+                continue
+            deadline = time.monotonic() + LOG_FLUSH_SECONDS
+            while len(rows) < LOG_BATCH:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    rows.append(self.queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self.write(rows)
+
+    def flush(self):
+        # write whatever is queued from this thread, then wait for the batch
+        # the writer thread may be holding
+        while True:
+            rows = []
+            while len(rows) < LOG_BATCH:
+                try:
+                    rows.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            if not rows:
+                break
+            self.write(rows)
+        self.queue.join()
+
+    def close(self):
+        self.stopping = True
+        self.flush()
+
+    def stats(self):
+        with self.lock:
+            return {'queued': self.queue.qsize(), 'written': self.written, 'batches': self.batches,
+                    'dropped': self.dropped, 'failed': self.failed}
+
+LOG_WRITER = LogWriter("INSERT INTO logs (message, log_time) VALUES (%s,%s)")
+atexit.register(LOG_WRITER.close)
 
 
 def log_event(msg):
-    try:
-        DB.execute("INSERT INTO logs VALUES (NULL,%s,NOW())", (msg,), commit=True)
-    except Exception:
-        pass
+    # the time is taken now, not when the batch reaches the server
+    LOG_WRITER.submit((msg, datetime.datetime.now()))
+
+
+def print_pool_stats():
+    s = DB.pool_stats()
+    print("Connections open:", s['open'], "idle:", s['idle'], "max:", DB.pool_size)
+    print("Checkouts:", s['checkouts'], "Waits:", s['waits'])
+    print("Handshakes:", s['handshakes'], "Handshakes avoided:", s['handshakes_avoided'], "Reconnects:", s['reconnects'])
+    lookups = s['stmt_hits'] + s['stmt_misses']
+    print("Prepared statements cached:", s['stmt_cached'], "Hit rate: %.1f%%" % (s['stmt_hits'] * 100.0 / lookups if lookups else 0),
+          "Evictions:", s['stmt_evictions'])
+    s = LOG_WRITER.stats()
+    print("Log queue depth:", s['queued'], "Written:", s['written'], "in", s['batches'], "batches")
+    print("Log events dropped:", s['dropped'], "failed:", s['failed'])
+    for table, (hits, misses) in REF_CACHE.stats().items():
+        print("Cache", table, "hits:", hits, "misses:", misses)
 
 
 def list_logs():
-    rows = DB.execute("SELECT * FROM logs ORDER BY id DESC LIMIT 50", fetchall=True)
-    for l in rows or []:
-        print(l['log_time'], l['message'])
+    LOG_WRITER.flush()
+    for r in DB.iterate("SELECT log_time, message FROM logs ORDER BY id DESC LIMIT 50"):
+        print(*r)
 
 # ======================================================
 # Extended Menus
@@ -567,31 +1617,49 @@ def service_order_menu():
 
 def admin_menu():
     while True:
-        print("1.Add User 2.List Users 3.View Logs 4.Back")
+        print("1.Add User 2.List Users 3.View Logs 4.Engine Stats 5.Query Plans 6.Startup Timing 7.Query Timings 8.Back")
         c = safe_input("Choice: ")
         if c == '1': add_user()
         elif c == '2': list_users()
         elif c == '3': list_logs()
-        elif c == '4': break
+        elif c == '4': print_pool_stats()
+        elif c == '5': print_query_plans()
+        elif c == '6': benchmark_startup()
+        elif c == '7': print_query_stats()
+        elif c == '8': break
 
 # ======================================================
 # Room Maintenance System
 # ======================================================
 
 def init_maintenance_table():
-    try:
-        DB.execute("CREATE TABLE IF NOT EXISTS maintenance (id INT AUTO_INCREMENT PRIMARY KEY, room_id INT, issue TEXT, status VARCHAR(20))", commit=True)
-    except Exception as e:
-        print("Maintenance table error:", e)
+    run_ddl("CREATE TABLE IF NOT EXISTS maintenance (id INT AUTO_INCREMENT PRIMARY KEY, room_id INT, issue TEXT, status VARCHAR(20))")
+
+
+def open_maintenance(rid, issue):
+    with DB.transaction():
+        mid = insert_row("INSERT INTO maintenance VALUES (NULL,%s,%s,'open')", (rid, issue))
+        DB.execute("UPDATE rooms SET status='maintenance' WHERE id=%s", (rid,))
+    AVAILABILITY.set_room_status(rid, 'maintenance')
+    return mid
+
+
+def close_maintenance(mid):
+    with DB.transaction():
+        m = DB.execute("SELECT * FROM maintenance WHERE id=%s FOR UPDATE", (mid,), fetchone=True)
+        if not m:
+            raise HotelError("Invalid ID")
+        DB.execute("UPDATE maintenance SET status='closed' WHERE id=%s", (mid,))
+        DB.execute("UPDATE rooms SET status='available' WHERE id=%s", (m['room_id'],))
+    AVAILABILITY.set_room_status(m['room_id'], 'available')
+    return m['room_id']
 
 
 def report_maintenance():
     try:
         list_rooms()
         rid = safe_int("Room ID: ")
-        issue = safe_input("Issue description: ")
-        DB.execute("INSERT INTO maintenance VALUES (NULL,%s,%s,'open')", (rid, issue), commit=True)
-        DB.execute("UPDATE rooms SET status='maintenance' WHERE id=%s", (rid,), commit=True)
+        open_maintenance(rid, safe_input("Issue description: "))
         print("Maintenance reported")
     except Exception as e:
         print("Maintenance error:", e)
@@ -599,17 +1667,11 @@ def report_maintenance():
 
 def resolve_maintenance():
     try:
-        rows = DB.execute("SELECT * FROM maintenance WHERE status='open'", fetchall=True)
-        for r in rows or []:
-            print(r['id'], r['room_id'], r['issue'])
-        mid = safe_int("Maintenance ID to close: ")
-        m = DB.execute("SELECT * FROM maintenance WHERE id=%s", (mid,), fetchone=True)
-        if not m:
-            print("Invalid ID")
-            return
-        DB.execute("UPDATE maintenance SET status='closed' WHERE id=%s", (mid,), commit=True)
-        DB.execute("UPDATE rooms SET status='available' WHERE id=%s", (m['room_id'],), commit=True)
+        browse("maintenance", "id, room_id, issue", "status='open'")
+        close_maintenance(safe_int("Maintenance ID to close: "))
         print("Maintenance closed")
+    except HotelError as e:
+        print(e)
     except Exception as e:
         print("Resolve error:", e)
 
@@ -618,10 +1680,41 @@ def resolve_maintenance():
 # ======================================================
 
 def init_inventory_usage_table():
-    try:
-        DB.execute("CREATE TABLE IF NOT EXISTS inventory_usage (id INT AUTO_INCREMENT PRIMARY KEY, item_id INT, quantity INT, used_on DATETIME)", commit=True)
-    except Exception as e:
-        print("Inventory usage table error:", e)
+    run_ddl("CREATE TABLE IF NOT EXISTS inventory_usage (id INT AUTO_INCREMENT PRIMARY KEY, item_id INT, quantity INT, used_on DATETIME)")
+
+
+def consume_items(cart):
+    # cart is [(item_id, qty), ...]; all lines succeed or none do. One
+    # conditional UPDATE decrements every row, so two clerks drawing on the
+    # same item can never both pass a stale stock check.
+    wanted = {}
+    for iid, qty in cart:
+        if qty <= 0:
+            raise HotelError("Quantity must be positive")
+        wanted[iid] = wanted.get(iid, 0) + qty
+    if not wanted:
+        return {}
+    ids = sorted(wanted)
+    marks = ",".join(["%s"] * len(ids))
+    case = "CASE id " + " ".join(["WHEN %s THEN %s"] * len(ids)) + " END"
+    case_params = [v for iid in ids for v in (iid, wanted[iid])]
+    used_on = datetime.datetime.now()
+    with DB.transaction():
+        changed = DB.execute(
+            "UPDATE inventory SET quantity=quantity-(" + case + ") "
+            "WHERE id IN (" + marks + ") AND quantity>=(" + case + ")",
+            case_params + ids + case_params, rowcount=True)
+        if changed != len(ids):
+            raise HotelError("Insufficient stock")
+        DB.executemany("INSERT INTO inventory_usage (item_id, quantity, used_on) VALUES (%s,%s,%s)",
+                       [(iid, wanted[iid], used_on) for iid in ids])
+        rows = DB.execute("SELECT id, quantity FROM inventory WHERE id IN (" + marks + ")", ids, fetchall=True)
+    return dict((r['id'], r['quantity']) for r in rows)
+
+
+def consume_item(iid, qty):
+    # returns the remaining quantity
+    return consume_items([(iid, qty)])[iid]
 
 
 def consume_inventory():
@@ -629,46 +1722,166 @@ def consume_inventory():
         list_inventory()
         iid = safe_int("Inventory ID: ")
         qty = safe_int("Quantity to use: ")
-        item = DB.execute("SELECT * FROM inventory WHERE id=%s", (iid,), fetchone=True)
-        if not item or item['quantity'] < qty:
-            print("Insufficient stock")
+        print("Inventory consumed. Remaining:", consume_item(iid, qty))
+    except Exception as e:
+        print("Consumption error:", e)
+
+
+def consume_cart():
+    try:
+        list_inventory()
+        cart = []
+        while True:
+            iid = safe_int("Inventory ID (0 to finish): ")
+            if iid == 0:
+                break
+            cart.append((iid, safe_int("Quantity to use: ")))
+        if not cart:
             return
-        new_qty = item['quantity'] - qty
-        DB.execute("UPDATE inventory SET quantity=%s WHERE id=%s", (new_qty, iid), commit=True)
-        DB.execute("INSERT INTO inventory_usage VALUES (NULL,%s,%s,NOW())", (iid, qty), commit=True)
-        print("Inventory consumed. Remaining:", new_qty)
+        for iid, left in sorted(consume_items(cart).items()):
+            print("Item", iid, "remaining:", left)
     except Exception as e:
         print("Consumption error:", e)
 
 
 def low_stock_report(threshold=5):
-    rows = DB.execute("SELECT * FROM inventory WHERE quantity<=%s", (threshold,), fetchall=True)
-    for r in rows or []:
-        print("LOW STOCK:", r['item'], r['quantity'])
+    for r in DB.iterate("SELECT item, quantity FROM inventory WHERE quantity<=%s", (threshold,)):
+        print("LOW STOCK:", *r)
+
+# ======================================================
+# Dynamic Pricing (Weekend / Season / Occupancy)
+# ======================================================
+
+# A night costs base price x day-of-week multiplier x season factor x
+# occupancy surge. Weekend nights are Friday and Saturday (date.weekday()).
+WEEKDAY_MULTIPLIER = 1.0
+WEEKEND_MULTIPLIER = 1.2
+WEEKEND_NIGHTS = (4, 5)
+# (share of a room type's rooms booked that night, surge), highest first;
+# below every level the surge is 1.0. The shares come from FORECAST.
+SURGE_TIERS = [(0.95, 1.4), (0.85, 1.25), (0.7, 1.1)]
+
+
+def stay_nights(start, end):
+    # dates of the nights from the check-in day up to the check-out day
+    first, last = to_datetime(start), to_datetime(end)
+    if first is None or last is None:
+        raise HotelError("Check-in and check-out dates are required")
+    first, last = first.date(), last.date()
+    if last <= first:
+        raise HotelError("Check-out must be after check-in")
+    return [first + datetime.timedelta(days=d) for d in range((last - first).days)]
+
+
+def season_factors(nights):
+    # per night, the highest factor among the seasons covering it, else 1.0
+    factors = [None] * len(nights)
+    for season in REF_CACHE.rows('seasons').values():
+        lo = bisect.bisect_left(nights, to_datetime(season['start_day']).date())
+        hi = bisect.bisect_right(nights, to_datetime(season['end_day']).date())
+        for i in range(lo, hi):
+            factors[i] = season['factor'] if factors[i] is None else max(factors[i], season['factor'])
+    return [1.0 if f is None else f for f in factors]
+
+
+def night_factors(nights):
+    return [(WEEKEND_MULTIPLIER if n.weekday() in WEEKEND_NIGHTS else WEEKDAY_MULTIPLIER) * f
+            for n, f in zip(nights, season_factors(nights))]
+
+
+def surge_factor(occupancy):
+    for level, factor in SURGE_TIERS:
+        if occupancy >= level:
+            return factor
+    return 1.0
+
+
+def quote_rooms(rooms, start, end, occupancy=None):
+    # One Quote per room (rows with id, room_type, price) for the same stay.
+    # The per-night factors depend only on the room type, so they are worked
+    # out once per type; the rooms x nights prices are then one NumPy
+    # expression when NumPy is installed and a plain loop otherwise. Nightly
+    # prices round half up to the cent the same way on both paths.
+    nights = stay_nights(start, end)
+    if occupancy is None:
+        occupancy = FORECAST.occupancy(nights)
+    base = night_factors(nights)
+    types = {}
+    for r in rooms:
+        types.setdefault(r['room_type'], len(types))
+    factors = [None] * len(types)
+    for t, i in types.items():
+        demand = occupancy.get(t) or [0] * len(nights)
+        factors[i] = [f * surge_factor(o) for f, o in zip(base, demand)]
+    which = [types[r['room_type']] for r in rooms]
+    prices = [float(r['price'] or 0) for r in rooms]
+    if numpy is not None and rooms:
+        nightly = numpy.floor(numpy.array(prices)[:, None] * numpy.array(factors)[which] * 100 + 0.5) / 100
+        totals = nightly.sum(axis=1).tolist()
+        nightly = nightly.tolist()
+    else:
+        nightly = [[math.floor(p * f * 100 + 0.5) / 100 for f in factors[i]] for p, i in zip(prices, which)]
+        totals = [sum(n) for n in nightly]
+    return [Quote(r['id'], r['room_type'], nights, n, round(t, 2)) for r, n, t in zip(rooms, nightly, totals)]
+
+
+def create_season(name, start_day, end_day, factor):
+    if to_datetime(end_day) < to_datetime(start_day):
+        raise HotelError("Season ends before it starts")
+    if factor <= 0:
+        raise HotelError("Season factor must be positive")
+    sid = insert_row("INSERT INTO seasons (name, start_day, end_day, factor) VALUES (%s,%s,%s,%s)", (name, start_day, end_day, factor))
+    REF_CACHE.invalidate('seasons')
+    return sid
+
+
+def add_season():
+    try:
+        create_season(safe_input("Season name: "), safe_input("First night (YYYY-MM-DD): "),
+                      safe_input("Last night (YYYY-MM-DD): "), safe_float("Factor (e.g. 1.5 peak, 0.8 off-peak): "))
+        print("Season added")
+    except HotelError as e:
+        print(e)
+    except Exception as e:
+        print("Season error:", e)
 
-# ======================================================
-# Dynamic Pricing (Weekend / Season)
-# ======================================================
 
-def calculate_dynamic_price(base_price, is_weekend, season_factor):
-    price = base_price
-    if is_weekend:
-        price *= 1.2
-    price *= season_factor
-    return round(price, 2)
+def list_seasons():
+    for s in sorted(REF_CACHE.rows('seasons').values(), key=lambda s: str(s['start_day'])):
+        print(s['id'], s['name'], s['start_day'], s['end_day'], s['factor'])
 
 
 def preview_room_price():
     list_rooms()
     rid = safe_int("Room ID: ")
-    room = DB.execute("SELECT * FROM rooms WHERE id=%s", (rid,), fetchone=True)
+    room = REF_CACHE.get('rooms', rid)
     if not room:
         print("Invalid room")
         return
-    weekend = safe_input("Weekend? (y/n): ").lower() == 'y'
-    factor = safe_float("Season factor (e.g. 1.0 normal, 1.5 peak): ")
-    price = calculate_dynamic_price(room['price'], weekend, factor)
-    print("Dynamic price:", price)
+    try:
+        q = quote_rooms([room], safe_input("Check-in (YYYY-MM-DD): "), safe_input("Check-out (YYYY-MM-DD): "))[0]
+        for night, price in zip(q.nights, q.nightly):
+            print(night, price)
+        print("Stay total:", q.total)
+    except HotelError as e:
+        print(e)
+    except Exception as e:
+        print("Pricing error:", e)
+
+
+def quote_free_rooms():
+    try:
+        rtype = safe_input("Room type (blank for any): ").strip() or None
+        start = safe_input("Check-in (YYYY-MM-DD): ")
+        end = safe_input("Check-out (YYYY-MM-DD): ")
+        rooms = AVAILABILITY.search(rtype, start=start, end=end)
+        for q in sorted(quote_rooms(rooms, start, end), key=lambda q: (q.total, q.room_id)):
+            print(q.room_id, q.room_type, q.total)
+        print(len(rooms), "room(s) free")
+    except HotelError as e:
+        print(e)
+    except Exception as e:
+        print("Pricing error:", e)
 
 # ======================================================
 # Extended Reports
@@ -680,14 +1893,75 @@ def report_employee_cost():
 
 
 def report_service_revenue():
-    rows = DB.execute("SELECT SUM(total) AS rev FROM service_orders", fetchone=True)
+    rows = DB.execute("SELECT SUM(service_revenue) AS rev FROM daily_revenue", fetchone=True)
     print("Service revenue:", rows['rev'])
 
 
+# every dashboard figure in one round trip
+DASHBOARD_SQL = """
+SELECT
+    (SELECT COUNT(*) FROM rooms) AS rooms,
+    (SELECT COUNT(*) FROM rooms WHERE status!='available') AS occupied,
+    (SELECT SUM(room_revenue) FROM daily_revenue) AS room_revenue,
+    (SELECT SUM(service_revenue) FROM daily_revenue) AS service_revenue,
+    (SELECT SUM(salary) FROM employees WHERE status='active') AS employee_cost,
+    (SELECT COUNT(*) FROM maintenance WHERE status='open') AS open_maintenance
+"""
+
+
+def fetch_dashboard(conn=None):
+    if conn is None:
+        return DB.execute(DASHBOARD_SQL, fetchone=True)
+    cur = conn.cursor(dictionary=True)
+    cur.execute(DASHBOARD_SQL)
+    row = cur.fetchone()
+    cur.close()
+    # end the read snapshot, otherwise the next refresh sees the same numbers
+    conn.rollback()
+    return row
+
+
+def print_dashboard(d):
+    if not d:
+        print("Dashboard unavailable")
+        return
+    rooms, occupied = d['rooms'] or 0, d['occupied'] or 0
+    print("Rooms:", rooms, "Occupied:", occupied, "Occupancy: %.1f%%" % ((occupied / rooms * 100) if rooms else 0))
+    print("Room revenue:", d['room_revenue'] or 0, "Service revenue:", d['service_revenue'] or 0)
+    print("Monthly employee cost:", d['employee_cost'] or 0, "Open maintenance:", d['open_maintenance'])
+
+
+def report_dashboard(watch=False, interval=5):
+    if not watch:
+        print_dashboard(fetch_dashboard())
+        return
+    # one pinned connection for the whole session, refreshed until Ctrl+C; a
+    # connection that fails is dropped and a fresh one taken on the next refresh
+    conn = None
+    try:
+        while True:
+            print("\n==", datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"), "==")
+            try:
+                if conn is None:
+                    conn = DB.acquire()
+                print_dashboard(fetch_dashboard(conn))
+            except (mysql.connector.Error, RuntimeError) as e:
+                # connect() reports its failures as RuntimeError
+                print("Dashboard unavailable:", e)
+                if conn is not None:
+                    DB.release(conn, discard=True)
+                    conn = None
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if conn is not None:
+            DB.release(conn)
+
+
 def report_inventory_usage():
-    rows = DB.execute("SELECT * FROM inventory_usage", fetchall=True)
-    for r in rows or []:
-        print(r['item_id'], r['quantity'], r['used_on'])
+    for r in DB.iterate("SELECT item_id, quantity, used_on FROM inventory_usage"):
+        print(*r)
 
 # ======================================================
 # Extended Menus for New Systems
@@ -704,20 +1978,25 @@ def maintenance_menu():
 
 def inventory_usage_menu():
     while True:
-        print("1.Consume Inventory 2.Low Stock Report 3.Usage Report 4.Back")
+        print("1.Consume Inventory 2.Consume Cart 3.Low Stock Report 4.Usage Report 5.Back")
         c = safe_input("Choice: ")
         if c == '1': consume_inventory()
-        elif c == '2': low_stock_report()
-        elif c == '3': report_inventory_usage()
-        elif c == '4': break
+        elif c == '2': consume_cart()
+        elif c == '3': low_stock_report()
+        elif c == '4': report_inventory_usage()
+        elif c == '5': break
 
 
 def pricing_menu():
     while True:
-        print("1.Preview Room Price 2.Back")
+        print("1.Preview Room Price 2.Quote Free Rooms 3.Add Season 4.List Seasons 5.Occupancy Forecast 6.Back")
         c = safe_input("Choice: ")
         if c == '1': preview_room_price()
-        elif c == '2': break
+        elif c == '2': quote_free_rooms()
+        elif c == '3': add_season()
+        elif c == '4': list_seasons()
+        elif c == '5': forecast_report()
+        elif c == '6': break
 
 
 def extended_reports_menu():
@@ -764,108 +2043,978 @@ def is_room_available(room_id, start_date, end_date):
         return False
 
 
+def book_room(cid, rid, start, end):
+    with DB.transaction():
+        # lock the room row so two desks cannot book the same dates at once
+        DB.execute("SELECT id FROM rooms WHERE id=%s FOR UPDATE", (rid,), fetchone=True)
+        if not is_room_available(rid, start, end):
+            raise HotelError("Room not available for selected dates")
+        DB.execute("INSERT INTO bookings VALUES (NULL,%s,%s,%s,%s,'reserved',0)", (cid, rid, start, end))
+        DB.execute("UPDATE rooms SET status='reserved' WHERE id=%s", (rid,))
+        b = DB.execute("SELECT * FROM bookings WHERE id=LAST_INSERT_ID()", fetchone=True)
+    booking_saved(b['id'], rid, start, end)
+    AVAILABILITY.set_room_status(rid, 'reserved')
+    return booking_of(b)
+
+
 def create_booking_with_dates():
     try:
         list_customers()
         cid = safe_int("Customer ID: ")
-        list_rooms()
-        rid = safe_int("Room ID: ")
         start = safe_input("Check-in (YYYY-MM-DD): ")
         end = safe_input("Check-out (YYYY-MM-DD): ")
-        if not is_room_available(rid, start, end):
-            print("Room not available for selected dates")
-            return
-        DB.execute("INSERT INTO bookings VALUES (NULL,%s,%s,%s,%s,'reserved',0)", (cid, rid, start, end), commit=True)
-        DB.execute("UPDATE rooms SET status='reserved' WHERE id=%s", (rid,), commit=True)
+        print("Free rooms for these dates:")
+        for r in AVAILABILITY.free_rooms(None, start, end):
+            print(r['id'], r['room_no'], r['room_type'], r['price'])
+        book_room(cid, safe_int("Room ID: "), start, end)
         print("Booking created with dates")
+    except HotelError as e:
+        print(e)
     except Exception as e:
         print("Booking date error:", e)
 
 # ======================================================
-# Vendor & Supplier Management
+# Room Availability Index (in-process)
 # ======================================================
 
-def init_vendor_tables():
+# Other desks book too, so the index is rebuilt from bookings at least this
+# often (seconds). Writes through this process update it immediately.
+AVAILABILITY_TTL = 60
+
+
+def to_datetime(value):
+    if value is None or value == '':
+        return None
+    if isinstance(value, datetime.datetime):
+        return value
+    if isinstance(value, datetime.date):
+        return datetime.datetime(value.year, value.month, value.day)
+    return datetime.datetime.fromisoformat(str(value).strip())
+
+
+class AvailabilityIndex:
+    # Per room, the active (reserved / checked_in) bookings as intervals sorted
+    # by start, plus a running maximum of their ends. Intervals starting
+    # at or before `end` are a prefix of the list, so a room is busy over
+    # [start, end] exactly when that prefix's max end reaches `start`: one
+    # bisect per room instead of one SQL query per room.
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.rooms = {}
+        self.starts = {}
+        self.spans = {}
+        self.max_end = {}
+        self.room_of = {}
+        self.by_type = {}
+        self.loaded = 0
+
+    def invalidate(self):
+        self.loaded = 0
+
+    def load(self):
+        rooms = DB.execute("SELECT id, room_no, room_type, price, status FROM rooms ORDER BY id", fetchall=True)
+        bookings = DB.execute("SELECT id, room_id, check_in, check_out FROM bookings WHERE status IN ('reserved','checked_in')", fetchall=True)
+        if rooms is None or bookings is None:
+            return
+        with self.lock:
+            self.rooms = dict((r['id'], r) for r in rooms)
+            self.spans = dict((rid, []) for rid in self.rooms)
+            self.room_of = {}
+            for b in bookings:
+                span = self.span(b['check_in'], b['check_out'], b['id'])
+                self.spans.setdefault(b['room_id'], []).append(span)
+                self.room_of[b['id']] = b['room_id']
+            for rid in self.spans:
+                self.spans[rid].sort()
+                self.reindex(rid)
+            self.catalog()
+            self.loaded = time.monotonic()
+
+    # by_type key for every room; a room_type of NULL is its own key (None)
+    ALL_TYPES = object()
+
+    def catalog(self):
+        # room ids by (price, id), over all rooms and per room type, with
+        # the prices alongside so a price band is two bisects
+        self.by_type = {self.ALL_TYPES: ([], [])}
+        for r in sorted(self.rooms.values(), key=lambda r: (r['price'] or 0, r['id'])):
+            for key in (self.ALL_TYPES, r['room_type']):
+                prices, ids = self.by_type.setdefault(key, ([], []))
+                prices.append(r['price'] or 0)
+                ids.append(r['id'])
+
+    def ensure(self):
+        if not self.loaded or time.monotonic() - self.loaded > AVAILABILITY_TTL:
+            self.load()
+
+    def span(self, start, end, booking_id):
+        start = to_datetime(start) or datetime.datetime.min
+        end = to_datetime(end) or datetime.datetime.max
+        return (start, end, booking_id)
+
+    def reindex(self, room_id):
+        spans = self.spans[room_id]
+        self.starts[room_id] = [s[0] for s in spans]
+        running = []
+        top = datetime.datetime.min
+        for s in spans:
+            top = max(top, s[1])
+            running.append(top)
+        self.max_end[room_id] = running
+
+    def add(self, booking_id, room_id, start, end):
+        with self.lock:
+            self.remove(booking_id)
+            bisect.insort(self.spans.setdefault(room_id, []), self.span(start, end, booking_id))
+            self.room_of[booking_id] = room_id
+            self.reindex(room_id)
+
+    def remove(self, booking_id):
+        with self.lock:
+            room_id = self.room_of.pop(booking_id, None)
+            if room_id is None:
+                return
+            self.spans[room_id] = [s for s in self.spans[room_id] if s[2] != booking_id]
+            self.reindex(room_id)
+
+    def set_room_status(self, room_id, status):
+        with self.lock:
+            if room_id in self.rooms:
+                self.rooms[room_id]['status'] = status
+
+    def busy(self, room_id, start, end):
+        # start/end already datetimes; same overlap test as is_room_available
+        starts = self.starts.get(room_id)
+        if not starts:
+            return False
+        i = bisect.bisect_right(starts, end)
+        return i > 0 and self.max_end[room_id][i - 1] >= start
+
+    def window(self, start, end):
+        # a blank end is an open-ended stay; a blank start is a mistake
+        start = to_datetime(start)
+        if start is None:
+            raise HotelError("A start date is required")
+        return start, to_datetime(end) or datetime.datetime.max
+
+    def is_free(self, room_id, start, end):
+        self.ensure()
+        start, end = self.window(start, end)
+        with self.lock:
+            return not self.busy(room_id, start, end)
+
+    def free_rooms(self, room_type, start, end):
+        self.ensure()
+        start, end = self.window(start, end)
+        with self.lock:
+            return [r for rid, r in self.rooms.items()
+                    if (not room_type or r['room_type'] == room_type)
+                    and r['status'] != 'maintenance'
+                    and not self.busy(rid, start, end)]
+
+    def search(self, room_type=None, low=None, high=None, status=None, start=None, end=None):
+        # rooms matching every facet given, cheapest first; with a date
+        # window, only rooms free (and not in maintenance) for all of it
+        self.ensure()
+        window = self.window(start, end) if start else None
+        with self.lock:
+            prices, ids = self.by_type.get(room_type or self.ALL_TYPES, ([], []))
+            lo = 0 if low is None else bisect.bisect_left(prices, low)
+            hi = len(ids) if high is None else bisect.bisect_right(prices, high)
+            rows = []
+            for rid in ids[lo:hi]:
+                r = self.rooms[rid]
+                if status and r['status'] != status:
+                    continue
+                if window and (r['status'] == 'maintenance' or self.busy(rid, *window)):
+                    continue
+                rows.append(r)
+            return rows
+
+    def calendar(self, room_type, first_day, days):
+        # {room_id: [True if busy on that day, ...]} for `days` days from first_day
+        self.ensure()
+        first = to_datetime(first_day)
+        windows = []
+        for d in range(days):
+            day = first + datetime.timedelta(days=d)
+            windows.append((day, day + datetime.timedelta(days=1) - datetime.timedelta(microseconds=1)))
+        with self.lock:
+            return dict((rid, [self.busy(rid, a, b) for a, b in windows])
+                        for rid, r in self.rooms.items()
+                        if not room_type or r['room_type'] == room_type)
+
+
+AVAILABILITY = AvailabilityIndex()
+
+
+def booking_saved(booking_id, room_id, start, end):
+    AVAILABILITY.add(booking_id, room_id, start, end)
+    room = REF_CACHE.get('rooms', room_id)
+    if room:
+        FORECAST.add(booking_id, room['room_type'], start, end)
+
+
+def booking_released(booking_id):
+    AVAILABILITY.remove(booking_id)
+    FORECAST.remove(booking_id)
+
+
+# sort key -> (row key, descending); the index already yields price order
+ROOM_SORTS = {
+    'price': (None, False),
+    '-price': (None, True),
+    'room_no': (lambda r: (str(r['room_no']), r['id']), False),
+    'type': (lambda r: (r['room_type'] or '', r['price'] or 0, r['id']), False),
+}
+
+
+def search_rooms(room_type=None, low=None, high=None, status=None, start=None, end=None,
+                 sort='price', page=1, page_size=PAGE_SIZE):
+    if sort not in ROOM_SORTS:
+        raise HotelError("Sort by one of: " + ", ".join(ROOM_SORTS))
+    rows = AVAILABILITY.search(room_type, low, high, status, start, end)
+    key, descending = ROOM_SORTS[sort]
+    if key:
+        rows.sort(key=key, reverse=descending)
+    elif descending:
+        rows.reverse()
+    pages = max(1, -(-len(rows) // page_size))
+    page = max(1, min(page, pages))
+    first = (page - 1) * page_size
+    return RoomPage([dict(r) for r in rows[first:first + page_size]], len(rows), page, pages)
+
+
+def page_rooms(**facets):
+    page = 1
+    while True:
+        result = search_rooms(page=page, **facets)
+        for r in result.rows:
+            print(r['id'], r['room_no'], r['room_type'], r['price'], r['status'])
+        print("%d room(s), page %d of %d" % (result.total, result.page, result.pages))
+        if result.page >= result.pages:
+            return result.total
+        if safe_input("-- Enter: next page, q: stop -- ").strip().lower() == 'q':
+            return result.total
+        page += 1
+
+
+def search_free_rooms():
     try:
-        DB.execute("CREATE TABLE IF NOT EXISTS vendors (id INT AUTO_INCREMENT PRIMARY KEY, name VARCHAR(100), phone VARCHAR(50), email VARCHAR(100))", commit=True)
-        DB.execute("CREATE TABLE IF NOT EXISTS purchase_orders (id INT AUTO_INCREMENT PRIMARY KEY, vendor_id INT, item VARCHAR(100), quantity INT, price FLOAT, status VARCHAR(20))", commit=True)
+        rtype = safe_input("Room type (blank for any): ").strip()
+        start = safe_input("From (YYYY-MM-DD): ")
+        end = safe_input("To (YYYY-MM-DD): ")
+        rows = AVAILABILITY.free_rooms(rtype, start, end)
+        for r in rows:
+            print(r['id'], r['room_no'], r['room_type'], r['price'])
+        print(len(rows), "room(s) free")
+    except HotelError as e:
+        print(e)
     except Exception as e:
-        print("Vendor table error:", e)
+        print("Availability error:", e)
+
+
+def occupancy_grid():
+    try:
+        rtype = safe_input("Room type (blank for any): ").strip()
+        first = safe_input("Start date (YYYY-MM-DD): ")
+        days = max(1, min(safe_int("Days (max 31): "), 31))
+        grid = AVAILABILITY.calendar(rtype, first, days)
+        print("Room      " + "".join(str((to_datetime(first) + datetime.timedelta(days=d)).day % 10) for d in range(days)))
+        for rid, busy in grid.items():
+            room_no = AVAILABILITY.rooms[rid]['room_no']
+            print(str(room_no).ljust(10) + "".join('#' if b else '.' for b in busy))
+    except Exception as e:
+        print("Calendar error:", e)
+
+# ======================================================
+# Yield Management (occupancy forecast)
+# ======================================================
+
+# nights ahead the forecast covers, tonight included
+FORECAST_HORIZON = 365
+# rebuilt from bookings at least this often (seconds) and when the date
+# changes; bookings made through this process update it straight away
+FORECAST_TTL = 60
+
+
+class OccupancyForecast:
+    # booked[room_type][i]: rooms of that type taken on night first + i by
+    # active (reserved / checked_in) bookings. A stay covers the nights from
+    # its check-in date up to its check-out date, at least one; open-ended
+    # stays run to the horizon. Each stay's nights are remembered, so a
+    # booking, check-in, checkout or cancellation only touches its own.
+
+    def __init__(self, horizon=FORECAST_HORIZON):
+        self.lock = threading.RLock()
+        self.horizon = horizon
+        self.first = None
+        self.rooms = Counter()
+        self.booked = {}
+        self.stays = {}
+        self.loaded = 0
+
+    def invalidate(self):
+        self.loaded = 0
+
+    def nights_of(self, start, end):
+        # [lo, hi) as offsets from self.first, clipped to the horizon
+        first = to_datetime(start).date() if start else self.first
+        last = to_datetime(end).date() if end else self.first + datetime.timedelta(days=self.horizon)
+        last = max(last, first + datetime.timedelta(days=1))
+        return max(0, (first - self.first).days), min(self.horizon, (last - self.first).days)
+
+    def load(self):
+        today = datetime.date.today()
+        until = today + datetime.timedelta(days=self.horizon)
+        rooms = DB.execute("SELECT room_type, COUNT(*) AS n FROM rooms GROUP BY room_type", fetchall=True)
+        bookings = DB.execute(
+            "SELECT b.id, b.check_in, b.check_out, r.room_type FROM bookings b JOIN rooms r ON r.id=b.room_id "
+            "WHERE b.status IN ('reserved','checked_in') AND b.check_in < %s AND (b.check_out IS NULL OR b.check_out >= %s)",
+            (until, today), fetchall=True)
+        if rooms is None or bookings is None:
+            return
+        with self.lock:
+            self.first = today
+            self.rooms = Counter(dict((r['room_type'], r['n']) for r in rooms))
+            # +1 on each stay's first night and -1 after its last, then one
+            # running sum per room type: O(bookings + types x horizon)
+            steps = dict((t, [0] * (self.horizon + 1)) for t in self.rooms)
+            self.stays = {}
+            for b in bookings:
+                lo, hi = self.nights_of(b['check_in'], b['check_out'])
+                if lo >= hi:
+                    continue
+                step = steps.setdefault(b['room_type'], [0] * (self.horizon + 1))
+                step[lo] += 1
+                step[hi] -= 1
+                self.stays[b['id']] = (b['room_type'], lo, hi)
+            self.booked = dict((t, array('i', accumulate(step[:-1]))) for t, step in steps.items())
+            self.loaded = time.monotonic()
+
+    def ensure(self):
+        if not self.loaded or time.monotonic() - self.loaded > FORECAST_TTL or self.first != datetime.date.today():
+            self.load()
+
+    def add(self, booking_id, room_type, start, end):
+        with self.lock:
+            self.remove(booking_id)
+            if not self.loaded:
+                return  # the next load counts it
+            lo, hi = self.nights_of(start, end)
+            if lo >= hi:
+                return
+            row = self.booked.setdefault(room_type, array('i', [0] * self.horizon))
+            for i in range(lo, hi):
+                row[i] += 1
+            self.stays[booking_id] = (room_type, lo, hi)
+
+    def remove(self, booking_id):
+        with self.lock:
+            stay = self.stays.pop(booking_id, None)
+            if stay is None:
+                return
+            row = self.booked[stay[0]]
+            for i in range(stay[1], stay[2]):
+                row[i] -= 1
+
+    def occupancy(self, nights):
+        # {room_type: [share of its rooms booked, per night]}; nights outside
+        # the horizon, past ones included, count as empty
+        self.ensure()
+        with self.lock:
+            offsets = [(n - self.first).days if self.first else -1 for n in nights]
+            shares = {}
+            for t, count in self.rooms.items():
+                row = self.booked.get(t)
+                shares[t] = [row[i] / float(count) if row and 0 <= i < self.horizon else 0.0 for i in offsets]
+            return shares
+
+
+FORECAST = OccupancyForecast()
+
+
+def forecast_report():
+    try:
+        days = max(1, min(safe_int("Nights ahead (max %d): " % FORECAST_HORIZON), FORECAST_HORIZON))
+        today = datetime.date.today()
+        nights = [today + datetime.timedelta(days=d) for d in range(days)]
+        shares = FORECAST.occupancy(nights)
+        types = sorted(shares, key=str)
+        print("Night       " + "".join(str(t).ljust(16) for t in types))
+        for i, night in enumerate(nights):
+            print(str(night).ljust(12) + "".join(("%3.0f%% x%.2f" % (shares[t][i] * 100, surge_factor(shares[t][i]))).ljust(16) for t in types))
+    except Exception as e:
+        print("Forecast error:", e)
+
+# ======================================================
+# Vendor & Supplier Management
+# ======================================================
+
+def init_vendor_tables():
+    run_ddl("CREATE TABLE IF NOT EXISTS vendors (id INT AUTO_INCREMENT PRIMARY KEY, name VARCHAR(100), phone VARCHAR(50), email VARCHAR(100))")
+    run_ddl("CREATE TABLE IF NOT EXISTS purchase_orders (id INT AUTO_INCREMENT PRIMARY KEY, vendor_id INT, item VARCHAR(100), quantity INT, price FLOAT, status VARCHAR(20))")
+
+
+def create_vendor(name, phone, email):
+    return insert_row("INSERT INTO vendors VALUES (NULL,%s,%s,%s)", (name, phone, email))
 
 
 def add_vendor():
     try:
-        name = safe_input("Vendor name: ")
-        phone = safe_input("Phone: ")
-        email = safe_input("Email: ")
-        DB.execute("INSERT INTO vendors VALUES (NULL,%s,%s,%s)", (name, phone, email), commit=True)
+        create_vendor(safe_input("Vendor name: "), safe_input("Phone: "), safe_input("Email: "))
         print("Vendor added")
     except Exception as e:
         print("Vendor error:", e)
 
 
 def list_vendors():
-    rows = DB.execute("SELECT * FROM vendors", fetchall=True)
-    for v in rows or []:
-        print(v['id'], v['name'], v['phone'])
+    browse("vendors", "id, name, phone")
+
+
+def place_purchase_order(vid, item, qty, price):
+    if qty <= 0:
+        raise HotelError("Quantity must be positive")
+    with DB.transaction():
+        if not DB.execute("SELECT id FROM vendors WHERE id=%s", (vid,), fetchone=True):
+            raise HotelError("Invalid vendor")
+        return insert_row("INSERT INTO purchase_orders VALUES (NULL,%s,%s,%s,%s,'ordered')", (vid, item, qty, price))
 
 
 def create_purchase_order():
     try:
         list_vendors()
-        vid = safe_int("Vendor ID: ")
-        item = safe_input("Item: ")
-        qty = safe_int("Quantity: ")
-        price = safe_float("Total price: ")
-        DB.execute("INSERT INTO purchase_orders VALUES (NULL,%s,%s,%s,%s,'ordered')", (vid, item, qty, price), commit=True)
+        place_purchase_order(safe_int("Vendor ID: "), safe_input("Item: "), safe_int("Quantity: "), safe_float("Total price: "))
         print("Purchase order created")
+    except HotelError as e:
+        print(e)
     except Exception as e:
         print("Purchase order error:", e)
 
 
 def list_purchase_orders():
-    rows = DB.execute("SELECT * FROM purchase_orders", fetchall=True)
-    for p in rows or []:
-        print(p['id'], p['vendor_id'], p['item'], p['quantity'], p['price'], p['status'])
+    browse("purchase_orders", "id, vendor_id, item, quantity, price, status")
 
 # ======================================================
-# Data Backup & Restore (SQL Table Copy)
+# Table Snapshots
 # ======================================================
 
-def backup_table(table_name):
+# A snapshot copies tables into shadow tables snap_<id>_<table> inside one
+# consistent-read transaction, so every table shows the same instant. An
+# incremental snapshot copies only the SNAPSHOT_CHUNK-wide id ranges whose
+# checksum changed since the snapshot it builds on (the tables carry no
+# modified-at column, so one grouped checksum scan finds them). Restore
+# layers those ranges over the full copy underneath into <table>__restore
+# and swaps it in with a single RENAME TABLE: the cost is the snapshot's
+# size, never a row-by-row DELETE of the live table.
+
+SNAPSHOT_CHUNK = 1000
+SNAPSHOT_SKIP = ('schema_version', 'schema_meta', 'snapshots', 'snapshot_tables', 'snapshot_chunks')
+# restoring any of these leaves daily_revenue out of date unless it is restored too
+REVENUE_SOURCES = ('bookings', 'service_orders', 'payments', 'invoices', 'cancellations', 'rooms')
+
+
+def quoted(name):
+    return "`" + name.replace("`", "``") + "`"
+
+
+def live_tables():
+    rows = DB.execute("SELECT table_name AS t FROM information_schema.tables "
+                      "WHERE table_schema=DATABASE() AND table_type='BASE TABLE'", fetchall=True) or []
+    return sorted(r['t'] for r in rows
+                  if r['t'] not in SNAPSHOT_SKIP and not r['t'].startswith('snap_')
+                  and not r['t'].endswith(('__restore', '__undo', '_backup')))
+
+
+def table_columns(table):
+    rows = DB.execute("SELECT column_name AS c FROM information_schema.columns "
+                      "WHERE table_schema=DATABASE() AND table_name=%s ORDER BY ordinal_position", (table,), fetchall=True) or []
+    return [r['c'] for r in rows]
+
+
+def chunk_checksums(table, columns):
+    # {chunk: (rows, crc)}; the ISNULL flags tell NULL apart from ''
+    values = ", ".join(quoted(c) for c in columns)
+    nulls = ", ".join("ISNULL(%s)" % quoted(c) for c in columns)
+    sql = ("SELECT id DIV %d AS chunk, COUNT(*) AS n, BIT_XOR(CRC32(CONCAT_WS('#', %s, CONCAT(%s)))) AS crc "
+           "FROM %s GROUP BY chunk" % (SNAPSHOT_CHUNK, values, nulls, quoted(table)))
+    return dict((r['chunk'], (r['n'], r['crc'])) for r in DB.execute(sql, fetchall=True))
+
+
+def copy_rows(table, shadow, columns, low=None, high=None):
+    # Plain SELECTs in id order, SNAPSHOT_CHUNK rows at a time, written to
+    # the shadow with executemany. Inside the snapshot transaction these are
+    # consistent reads of the same view the checksums came from; an
+    # INSERT ... SELECT would be a locking read of the latest rows instead
+    # and would hold share locks on the live table until the commit.
+    names = ", ".join(quoted(c) for c in columns)
+    insert = "INSERT INTO %s (%s) VALUES (%s)" % (quoted(shadow), names, ", ".join(["%s"] * len(columns)))
+    select = "SELECT %s FROM %s" % (names, quoted(table))
+    if 'id' not in columns:
+        # only small lookup/rollup tables have no id to page on
+        rows = DB.execute(select, fetchall=True)
+        DB.executemany(insert, [tuple(r[c] for c in columns) for r in rows])
+        return
+    select += " WHERE id > %s" + (" AND id < %s" if high is not None else "") + " ORDER BY id LIMIT %s"
+    last = low - 1 if low is not None else -2 ** 63
+    while True:
+        rows = DB.execute(select, (last,) + ((high,) if high is not None else ()) + (SNAPSHOT_CHUNK,), fetchall=True)
+        if not rows:
+            return
+        DB.executemany(insert, [tuple(r[c] for c in columns) for r in rows])
+        if len(rows) < SNAPSHOT_CHUNK:
+            return
+        last = rows[-1]['id']
+
+
+def id_ranges(chunks):
+    # consecutive chunks merged into [low, high) id ranges
+    ranges = []
+    for c in sorted(chunks):
+        if ranges and ranges[-1][1] == c * SNAPSHOT_CHUNK:
+            ranges[-1][1] = (c + 1) * SNAPSHOT_CHUNK
+        else:
+            ranges.append([c * SNAPSHOT_CHUNK, (c + 1) * SNAPSHOT_CHUNK])
+    return ranges
+
+
+def take_snapshot(tables=None, incremental=False):
+    available = live_tables()
+    tables = list(tables or available)
+    unknown = [t for t in tables if t not in available]
+    if unknown:
+        raise HotelError("Unknown table: " + ", ".join(unknown))
+    base = None
+    previous = {}
+    if incremental:
+        row = DB.execute("SELECT MAX(id) AS id FROM snapshots", fetchone=True)
+        base = row['id'] if row else None
+        if base is None:
+            raise HotelError("No snapshot to build on yet; take a full one first")
+        for r in DB.execute("SELECT table_name, chunk, row_count, crc FROM snapshot_chunks "
+                            "WHERE snapshot_id=%s AND row_count>0", (base,), fetchall=True) or []:
+            previous.setdefault(r['table_name'], {})[r['chunk']] = (r['row_count'], r['crc'])
+    columns = dict((t, table_columns(t)) for t in tables)
+    started = time.perf_counter()
+    sid = insert_row("INSERT INTO snapshots (taken_on, kind, base_id) VALUES (NOW(),%s,%s)",
+                     ('incremental' if incremental else 'full', base))
+    shadows = dict((t, "snap_%d_%s" % (sid, t)) for t in tables)
+    copied = {}
     try:
-        backup_table = table_name + "_backup"
-        DB.execute(f"CREATE TABLE IF NOT EXISTS {backup_table} AS SELECT * FROM {table_name}", commit=True)
-        print("Backup created for", table_name)
+        for t in tables:
+            run_ddl("CREATE TABLE %s LIKE %s" % (quoted(shadows[t]), quoted(t)))
+        with DB.transaction() as conn:
+            conn.start_transaction(consistent_snapshot=True)
+            for t in tables:
+                has_id = 'id' in columns[t]
+                current = chunk_checksums(t, columns[t]) if has_id else {}
+                if has_id and t in previous:
+                    before = previous[t]
+                    changed = set(c for c in set(current) | set(before) if current.get(c) != before.get(c))
+                    for low, high in id_ranges(changed):
+                        copy_rows(t, shadows[t], columns[t], low, high)
+                    complete = 0
+                else:
+                    copy_rows(t, shadows[t], columns[t])
+                    changed = set(current)
+                    complete = 1
+                DB.executemany("INSERT INTO snapshot_chunks VALUES (%s,%s,%s,%s,%s,%s)",
+                               [(sid, t, c, current.get(c, (0, 0))[0], current.get(c, (0, 0))[1], c in changed)
+                                for c in set(current) | changed])
+                count = DB.execute("SELECT COUNT(*) AS c FROM " + quoted(shadows[t]), fetchone=True)['c']
+                DB.execute("INSERT INTO snapshot_tables VALUES (%s,%s,%s,%s,%s)", (sid, t, shadows[t], count, complete))
+                copied[t] = count
+    except Exception:
+        drop_shadows(shadows.values())
+        DB.execute("DELETE FROM snapshots WHERE id=%s", (sid,), commit=True)
+        raise
+    return sid, copied, time.perf_counter() - started
+
+
+def drop_shadows(names):
+    for name in names:
+        try:
+            run_ddl("DROP TABLE IF EXISTS " + quoted(name))
+        except Exception as e:
+            print("Could not drop", name + ":", e)
+
+
+def restore_plan(sid, table):
+    # the snapshot_tables rows to read, newest first, ending at a complete copy
+    chain = []
+    while sid is not None:
+        entry = DB.execute("SELECT * FROM snapshot_tables WHERE snapshot_id=%s AND table_name=%s", (sid, table), fetchone=True)
+        if not entry:
+            raise HotelError("Snapshot %d has no copy of %s to build on" % (sid, table))
+        chain.append(entry)
+        if entry['complete']:
+            return chain
+        sid = DB.execute("SELECT base_id FROM snapshots WHERE id=%s", (sid,), fetchone=True)['base_id']
+    raise HotelError("Incomplete snapshot chain for " + table)
+
+
+def restore_snapshot(sid=None, tables=None):
+    if sid is None:
+        row = DB.execute("SELECT MAX(id) AS id FROM snapshots", fetchone=True)
+        sid = row['id'] if row else None
+        if sid is None:
+            raise HotelError("No snapshots taken yet")
+    held = [r['table_name'] for r in DB.execute("SELECT table_name FROM snapshot_tables WHERE snapshot_id=%s", (sid,), fetchall=True) or []]
+    tables = list(tables or held)
+    missing = [t for t in tables if t not in held]
+    if not held or missing:
+        raise HotelError("Snapshot %s does not contain: %s" % (sid, ", ".join(missing) or "any tables"))
+    plans = dict((t, restore_plan(sid, t)) for t in tables)
+    started = time.perf_counter()
+    staging = ["%s__restore" % t for t in tables]
+    drop_shadows(staging)
+    try:
+        for t in tables:
+            run_ddl("CREATE TABLE %s LIKE %s" % (quoted(t + "__restore"), quoted(plans[t][0]['shadow'])))
+        with DB.transaction():
+            for t in tables:
+                covered = []
+                for entry in plans[t]:
+                    sql = "INSERT INTO %s SELECT * FROM %s" % (quoted(t + "__restore"), quoted(entry['shadow']))
+                    params = ()
+                    if covered:
+                        # ranges a newer snapshot in the chain already supplied
+                        sql += (" WHERE id DIV %d NOT IN (SELECT chunk FROM snapshot_chunks WHERE table_name=%%s "
+                                "AND stored=1 AND snapshot_id IN (%s))" % (SNAPSHOT_CHUNK, ",".join(str(c) for c in covered)))
+                        params = (t,)
+                    DB.execute(sql, params)
+                    covered.append(entry['snapshot_id'])
+        # all tables change at the same instant
+        run_ddl("RENAME TABLE " + ", ".join("%s TO %s, %s TO %s" % (
+            quoted(t), quoted(t + "__undo"), quoted(t + "__restore"), quoted(t)) for t in tables))
+    except Exception:
+        drop_shadows(staging)
+        raise
+    drop_shadows(["%s__undo" % t for t in tables])
+    for table in REF_CACHE.tables:
+        REF_CACHE.invalidate(table)
+    AVAILABILITY.invalidate()
+    FORECAST.invalidate()
+    CUSTOMER_INDEX.invalidate()
+    if 'daily_revenue' not in tables and any(t in REVENUE_SOURCES for t in tables):
+        rebuild_daily_revenue()
+    return sid, tables, time.perf_counter() - started
+
+
+def drop_snapshot(sid):
+    if DB.execute("SELECT id FROM snapshots WHERE base_id=%s LIMIT 1", (sid,), fetchone=True):
+        raise HotelError("Snapshot %d has incremental snapshots built on it" % sid)
+    rows = DB.execute("SELECT shadow FROM snapshot_tables WHERE snapshot_id=%s", (sid,), fetchall=True) or []
+    drop_shadows(r['shadow'] for r in rows)
+    with DB.transaction():
+        DB.execute("DELETE FROM snapshot_chunks WHERE snapshot_id=%s", (sid,))
+        DB.execute("DELETE FROM snapshot_tables WHERE snapshot_id=%s", (sid,))
+        DB.execute("DELETE FROM snapshots WHERE id=%s", (sid,))
+
+
+def list_snapshots():
+    sql = ("SELECT s.id, s.taken_on, s.kind, s.base_id, COUNT(t.table_name) AS tables, SUM(t.row_count) AS copied "
+           "FROM snapshots s LEFT JOIN snapshot_tables t ON t.snapshot_id=s.id GROUP BY s.id, s.taken_on, s.kind, s.base_id ORDER BY s.id")
+    for r in DB.iterate(sql):
+        print(*r)
+
+
+def table_list(text):
+    return [t.strip() for t in (text or '').split(',') if t.strip()]
+
+
+def snapshot_tables(tables=None, incremental=False):
+    try:
+        sid, copied, seconds = take_snapshot(tables, incremental)
+        print("Snapshot", sid, "taken in %.1f s:" % seconds, sum(copied.values()), "rows copied from", len(copied), "tables")
     except Exception as e:
-        print("Backup error:", e)
+        print("Snapshot error:", e)
 
 
-def restore_table(table_name):
+def restore_tables(sid=None, tables=None):
     try:
-        backup_table = table_name + "_backup"
-        DB.execute(f"DELETE FROM {table_name}", commit=True)
-        DB.execute(f"INSERT INTO {table_name} SELECT * FROM {backup_table}", commit=True)
-        print("Table restored from backup")
+        sid, restored, seconds = restore_snapshot(sid, tables)
+        print("Restored", ", ".join(restored), "from snapshot", sid, "in %.1f s" % seconds)
     except Exception as e:
         print("Restore error:", e)
 
+
+def remove_snapshot(sid):
+    try:
+        drop_snapshot(sid)
+        print("Snapshot", sid, "dropped")
+    except Exception as e:
+        print("Snapshot error:", e)
+
+# ======================================================
+# Customer Search Index (in-process)
+# ======================================================
+
+# LIKE '%kw%' cannot use an index, so customer lookups go through this one:
+# sorted name / email words for prefix matches, reversed phone digits for
+# suffix matches and word trigrams for fuzzy matches. It holds only ids;
+# the winning rows are read back by primary key. Customers added by other
+# desks are picked up by id every CUSTOMER_INDEX_REFRESH seconds, and the
+# whole index is rebuilt every CUSTOMER_INDEX_TTL seconds.
+CUSTOMER_INDEX_REFRESH = 5
+CUSTOMER_INDEX_TTL = 3600
+SEARCH_LIMIT = 20
+# lowest trigram similarity still shown as a fuzzy match
+FUZZY_MIN = 0.25
+# a one-letter prefix can match much of the vocabulary; look at most this far
+PREFIX_SCAN = 2000
+
+
+def search_words(text):
+    return [w for w in re.split(r'[\W_]+', (text or '').lower()) if w]
+
+
+def trigrams(words):
+    grams = set()
+    for w in words:
+        padded = "  " + w + " "
+        for i in range(len(padded) - 2):
+            grams.add(padded[i:i + 3])
+    return grams
+
+
+def phone_key(phone):
+    # digits only, reversed, so a suffix search is a prefix range
+    return re.sub(r'\D', '', phone or '')[::-1]
+
+
+class CustomerIndex:
+    # vocab: every distinct name word and email-name word, sorted, so a
+    # prefix is a bisect range; emails likewise for whole addresses.
+    # ids[word or email] the customers using it (an int while there is only
+    # one). grams: name-word trigrams -> words, for fuzzy matches over the
+    # vocabulary rather than over every customer.
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.vocab = []
+        self.emails = []
+        self.ids = {}
+        self.grams = {}
+        self.phone_keys, self.phone_ids = [], array('i')
+        self.max_id = 0
+        self.loaded = 0
+        self.checked = 0
+
+    def invalidate(self):
+        self.loaded = 0
+
+    def changed(self):
+        # new rows were written: look for them on the next search
+        self.checked = 0
+
+    def entries(self, name, phone, email):
+        words = set(search_words(name))
+        keys = set(words)
+        if email:
+            keys.update(search_words(email.split('@')[0]))
+            email = email.strip().lower()
+            keys.add(email)
+        return words, keys, phone_key(phone)
+
+    def post(self, ids, grams, key, cid, fuzzy):
+        have = ids.get(key)
+        if have is None:
+            ids[key] = cid
+            if fuzzy:
+                for g in trigrams([key]):
+                    grams.setdefault(g, []).append(key)
+            return True
+        if isinstance(have, int):
+            ids[key] = array('i', (have, cid))
+        else:
+            have.append(cid)
+        return False
+
+    def load(self):
+        ids, grams, phones = {}, {}, []
+        max_id = 0
+        for cid, name, phone, email in DB.iterate("SELECT id, name, phone, email FROM customers ORDER BY id", batch_size=5000, strict=True):
+            words, keys, digits = self.entries(name, phone, email)
+            for k in keys:
+                self.post(ids, grams, k, cid, k in words)
+            if digits:
+                phones.append((digits, cid))
+            max_id = cid
+        phones.sort()
+        with self.lock:
+            self.vocab = sorted(k for k in ids if '@' not in k)
+            self.emails = sorted(k for k in ids if '@' in k)
+            self.ids = ids
+            self.grams = grams
+            self.phone_keys = [p for p, _ in phones]
+            self.phone_ids = array('i', (cid for _, cid in phones))
+            self.max_id = max_id
+            self.loaded = self.checked = time.monotonic()
+
+    def add(self, cid, name, phone, email):
+        words, keys, digits = self.entries(name, phone, email)
+        with self.lock:
+            if not self.loaded:
+                return
+            for k in keys:
+                if self.post(self.ids, self.grams, k, cid, k in words):
+                    bisect.insort(self.emails if '@' in k else self.vocab, k)
+            if digits:
+                i = bisect.bisect_right(self.phone_keys, digits)
+                self.phone_keys.insert(i, digits)
+                self.phone_ids.insert(i, cid)
+            self.max_id = max(self.max_id, cid)
+
+    def ensure(self):
+        now = time.monotonic()
+        if not self.loaded or now - self.loaded > CUSTOMER_INDEX_TTL:
+            self.load()
+            return
+        if now - self.checked < CUSTOMER_INDEX_REFRESH:
+            return
+        self.checked = now
+        rows = DB.execute("SELECT id, name, phone, email FROM customers WHERE id>%s ORDER BY id LIMIT 1001", (self.max_id,), fetchall=True) or []
+        if len(rows) > 1000:
+            self.load()
+            return
+        for r in rows:
+            self.add(r['id'], r['name'], r['phone'], r['email'])
+
+    def prefix_range(self, keys, prefix):
+        lo = bisect.bisect_left(keys, prefix)
+        return lo, min(bisect.bisect_left(keys, prefix + '\U0010ffff'), lo + PREFIX_SCAN)
+
+    def matching_words(self, q, fuzzy=True):
+        # [(score, word)], best first: the word itself 1, longer words with
+        # q as prefix 0.5-0.9, words sharing enough trigrams below 0.5
+        keys = self.emails if '@' in q else self.vocab
+        lo, hi = self.prefix_range(keys, q)
+        scored = dict((w, 1.0 if w == q else 0.5 + 0.4 * len(q) / len(w)) for w in keys[lo:hi])
+        if not fuzzy:
+            return sorted(((s, w) for w, s in scored.items()), reverse=True)
+        grams = trigrams([q])
+        shared = Counter()
+        for g in grams:
+            shared.update(self.grams.get(g, ()))
+        for w, common in shared.items():
+            if w not in scored:
+                similarity = common / float(len(grams) + len(w) + 1 - common)
+                if similarity >= FUZZY_MIN:
+                    scored[w] = 0.5 * similarity
+        return sorted(((s, w) for w, s in scored.items()), reverse=True)
+
+    def customers_of(self, word):
+        have = self.ids.get(word, ())
+        return (have,) if isinstance(have, int) else have
+
+    def match_all(self, words, fuzzy):
+        matched = None
+        for q in words:
+            best = {}
+            for score, w in self.matching_words(q, fuzzy):
+                for cid in self.customers_of(w):
+                    if cid not in best and (matched is None or cid in matched):
+                        best[cid] = score
+            matched = best if matched is None else dict((c, matched[c] + s) for c, s in best.items())
+            if not matched:
+                break
+        return matched
+
+    def search(self, query, limit=SEARCH_LIMIT):
+        # [(id, score)], best first; phone-digit queries match number endings
+        # (0.9, 1 for the whole number)
+        self.ensure()
+        query = (query or '').strip()
+        scores = {}
+        with self.lock:
+            if re.fullmatch(r'[\d\s+()\-.]{3,}', query):
+                key = phone_key(query)
+                lo, hi = self.prefix_range(self.phone_keys, key)
+                for i in range(lo, hi):
+                    scores[self.phone_ids[i]] = 1.0 if self.phone_keys[i] == key else 0.9
+            words = [query.lower()] if '@' in query else search_words(query)
+            if len(words) == 1:
+                # words come best first, so stop once `limit` customers are in
+                for score, w in self.matching_words(words[0]):
+                    if len(scores) >= limit:
+                        break
+                    for cid in self.customers_of(w):
+                        if score > scores.get(cid, 0):
+                            scores[cid] = score
+            elif words:
+                # every word has to match; typos are only tried when the
+                # words as typed find nobody
+                matched = self.match_all(words, False) or self.match_all(words, True)
+                for cid, s in matched.items():
+                    scores[cid] = max(scores.get(cid, 0), s / len(words))
+        return heapq.nlargest(limit, scores.items(), key=lambda kv: (kv[1], -kv[0]))
+
+CUSTOMER_INDEX = CustomerIndex()
+
+
+def search_customers(query, limit=SEARCH_LIMIT):
+    # matching customer rows, best first, each with its 'score'
+    ranked = CUSTOMER_INDEX.search(query, limit)
+    if not ranked:
+        return []
+    marks = ",".join(["%s"] * len(ranked))
+    rows = DB.execute("SELECT id, name, phone, email FROM customers WHERE id IN (" + marks + ")",
+                      [cid for cid, _ in ranked], fetchall=True) or []
+    by_id = dict((r['id'], r) for r in rows)
+    result = []
+    for cid, score in ranked:
+        if cid in by_id:
+            by_id[cid]['score'] = round(score, 3)
+            result.append(by_id[cid])
+    return result
+
 # ======================================================
 # Search & Filter Utilities
 # ======================================================
 
+def find_customers(keyword, limit=SEARCH_LIMIT):
+    # (id, name, phone) rows, best match first
+    return [(r['id'], r['name'], r['phone']) for r in search_customers(keyword, limit)]
+
+
 def search_customer_by_name():
-    name = safe_input("Customer name keyword: ")
-    rows = DB.execute("SELECT * FROM customers WHERE name LIKE %s", ("%"+name+"%",), fetchall=True)
-    for r in rows or []:
-        print(r['id'], r['name'], r['phone'])
+    try:
+        for r in search_customers(safe_input("Name, email or phone digits: ")):
+            print(r['id'], r['name'], r['phone'], r['email'], "(%.2f)" % r['score'])
+    except Exception as e:
+        print("Search error:", e)
 
 
-def search_room_by_type():
-    rtype = safe_input("Room type: ")
-    rows = DB.execute("SELECT * FROM rooms WHERE room_type=%s", (rtype,), fetchall=True)
-    for r in rows or []:
-        print(r['id'], r['room_no'], r['price'], r['status'])
+def optional_float(msg):
+    while True:
+        text = safe_input(msg).strip()
+        if not text:
+            return None
+        try:
+            return float(text)
+        except ValueError:
+            print("Enter valid number")
+
+
+def search_room():
+    try:
+        facets = dict(
+            room_type=safe_input("Room type (blank for any): ").strip() or None,
+            low=optional_float("Min price (blank for none): "),
+            high=optional_float("Max price (blank for none): "),
+            status=safe_input("Status (blank for any): ").strip() or None,
+            start=safe_input("Free from (YYYY-MM-DD, blank for any dates): ").strip() or None,
+        )
+        if facets['start']:
+            facets['end'] = safe_input("Free to (YYYY-MM-DD): ").strip() or None
+        facets['sort'] = safe_input("Sort (" + "/".join(ROOM_SORTS) + ", blank for price): ").strip() or 'price'
+        page_rooms(**facets)
+    except HotelError as e:
+        print(e)
+    except Exception as e:
+        print("Search error:", e)
 
 # ======================================================
 # Vendor Menu
@@ -887,11 +3036,14 @@ def vendor_menu():
 
 def backup_menu():
     while True:
-        print("1.Backup Table 2.Restore Table 3.Back")
+        print("1.Snapshot 2.Incremental Snapshot 3.List Snapshots 4.Restore 5.Drop Snapshot 6.Back")
         c = safe_input("Choice: ")
-        if c == '1': backup_table(safe_input("Table name: "))
-        elif c == '2': restore_table(safe_input("Table name: "))
-        elif c == '3': break
+        if c == '1': snapshot_tables(table_list(safe_input("Tables (comma separated, blank for all): ")))
+        elif c == '2': snapshot_tables(table_list(safe_input("Tables (comma separated, blank for all): ")), incremental=True)
+        elif c == '3': list_snapshots()
+        elif c == '4': restore_tables(safe_int("Snapshot ID: "), table_list(safe_input("Tables (comma separated, blank for all in snapshot): ")))
+        elif c == '5': remove_snapshot(safe_int("Snapshot ID: "))
+        elif c == '6': break
 
 # ======================================================
 # Search Menu
@@ -902,36 +3054,68 @@ def search_menu():
         print("1.Search Customer 2.Search Room 3.Back")
         c = safe_input("Choice: ")
         if c == '1': search_customer_by_name()
-        elif c == '2': search_room_by_type()
+        elif c == '2': search_room()
         elif c == '3': break
 
 # ======================================================
 # Attendance-based Salary Calculation
 # ======================================================
 
+def month_bounds(month, year):
+    # [first day, first day of next month) so the attendance (employee_id, date)
+    # index can be range-scanned instead of evaluating MONTH()/YEAR() per row
+    start = datetime.date(year, month, 1)
+    end = datetime.date(year + 1, 1, 1) if month == 12 else datetime.date(year, month + 1, 1)
+    return start, end
+
+
+def salary_for_days(salary, days):
+    if salary is None:
+        return 0
+    daily = salary / 30
+    return round(days * daily, 2)
+
+
 def calculate_salary_from_attendance(employee_id, month, year):
     try:
-        sql = "SELECT COUNT(*) AS days FROM attendance WHERE employee_id=%s AND MONTH(date)=%s AND YEAR(date)=%s"
-        row = DB.execute(sql, (employee_id, month, year), fetchone=True)
+        start, end = month_bounds(month, year)
+        sql = "SELECT COUNT(*) AS days FROM attendance WHERE employee_id=%s AND date>=%s AND date<%s"
+        row = DB.execute(sql, (employee_id, start, end), fetchone=True)
         days = row['days'] if row else 0
         emp = DB.execute("SELECT salary FROM employees WHERE id=%s", (employee_id,), fetchone=True)
         if not emp:
             return 0
-        daily = emp['salary'] / 30
-        return round(days * daily, 2)
+        return salary_for_days(emp['salary'], days)
     except Exception:
         return 0
 
 
+def payroll_rows(month, year, from_attendance=False):
+    if not from_attendance:
+        rows = DB.execute("SELECT id, salary FROM employees WHERE status='active'", fetchall=True)
+        return [(r['id'], month, year, r['salary']) for r in rows or []]
+    # day counts for every active employee in one grouped query
+    start, end = month_bounds(month, year)
+    sql = ("SELECT e.id, e.salary, COUNT(a.id) AS days FROM employees e "
+           "LEFT JOIN attendance a ON a.employee_id=e.id AND a.date>=%s AND a.date<%s "
+           "WHERE e.status='active' GROUP BY e.id, e.salary")
+    rows = DB.execute(sql, (start, end), fetchall=True)
+    return [(r['id'], month, year, salary_for_days(r['salary'], r['days'])) for r in rows or []]
+
+
+def run_payroll(month, year, from_attendance=False):
+    rows = payroll_rows(month, year, from_attendance)
+    with DB.transaction():
+        DB.executemany("INSERT INTO payroll (employee_id, month, year, amount) VALUES (%s,%s,%s,%s)", rows)
+    return len(rows)
+
+
 def generate_payroll_from_attendance():
     try:
         month = safe_int("Month: ")
         year = safe_int("Year: ")
-        employees = DB.execute("SELECT * FROM employees WHERE status='active'", fetchall=True)
-        for e in employees or []:
-            amount = calculate_salary_from_attendance(e['id'], month, year)
-            DB.execute("INSERT INTO payroll VALUES (NULL,%s,%s,%s,%s)", (e['id'], month, year, amount), commit=True)
-        print("Attendance-based payroll generated")
+        count = run_payroll(month, year, from_attendance=True)
+        print("Attendance-based payroll generated for", count, "employees")
     except Exception as e:
         print("Payroll error:", e)
 
@@ -940,40 +3124,51 @@ def generate_payroll_from_attendance():
 # ======================================================
 
 def init_tax_table():
-    try:
-        DB.execute("CREATE TABLE IF NOT EXISTS tax_rates (id INT AUTO_INCREMENT PRIMARY KEY, name VARCHAR(100), rate FLOAT)", commit=True)
-    except Exception as e:
-        print("Tax table error:", e)
+    run_ddl("CREATE TABLE IF NOT EXISTS tax_rates (id INT AUTO_INCREMENT PRIMARY KEY, name VARCHAR(100), rate FLOAT)")
+
+
+def create_tax_rate(name, rate):
+    tid = insert_row("INSERT INTO tax_rates VALUES (NULL,%s,%s)", (name, rate))
+    REF_CACHE.invalidate('tax_rates')
+    return tid
 
 
 def add_tax_rate():
-    name = safe_input("Tax name: ")
-    rate = safe_float("Rate (%): ")
-    DB.execute("INSERT INTO tax_rates VALUES (NULL,%s,%s)", (name, rate), commit=True)
-    print("Tax rate added")
+    try:
+        create_tax_rate(safe_input("Tax name: "), safe_float("Rate (%): "))
+        print("Tax rate added")
+    except Exception as e:
+        print("Tax error:", e)
 
 
 def list_tax_rates():
-    rows = DB.execute("SELECT * FROM tax_rates", fetchall=True)
-    for t in rows or []:
+    for t in REF_CACHE.rows('tax_rates').values():
         print(t['id'], t['name'], t['rate'])
 
 
+def apply_tax(iid, tid):
+    tax = REF_CACHE.get('tax_rates', tid)
+    if not tax:
+        raise HotelError("Invalid selection")
+    with DB.transaction():
+        # locked so two desks taxing the same invoice cannot lose an update
+        inv = DB.execute("SELECT * FROM invoices WHERE id=%s FOR UPDATE", (iid,), fetchone=True)
+        if not inv:
+            raise HotelError("Invalid selection")
+        new_amt = inv['amount'] + inv['amount'] * tax['rate'] / 100
+        DB.execute("UPDATE invoices SET amount=%s WHERE id=%s", (new_amt, iid))
+    return Invoice(iid, inv['booking_id'], new_amt, inv['paid'], inv['status'])
+
+
 def apply_tax_to_invoice():
     try:
         list_invoices()
         iid = safe_int("Invoice ID: ")
         list_tax_rates()
-        tid = safe_int("Tax ID: ")
-        tax = DB.execute("SELECT * FROM tax_rates WHERE id=%s", (tid,), fetchone=True)
-        inv = DB.execute("SELECT * FROM invoices WHERE id=%s", (iid,), fetchone=True)
-        if not tax or not inv:
-            print("Invalid selection")
-            return
-        tax_amt = inv['amount'] * tax['rate'] / 100
-        new_amt = inv['amount'] + tax_amt
-        DB.execute("UPDATE invoices SET amount=%s WHERE id=%s", (new_amt, iid), commit=True)
-        print("Tax applied. New amount:", new_amt)
+        inv = apply_tax(iid, safe_int("Tax ID: "))
+        print("Tax applied. New amount:", inv.amount)
+    except HotelError as e:
+        print(e)
     except Exception as e:
         print("Tax apply error:", e)
 
@@ -985,10 +3180,9 @@ def room_availability_calendar():
     try:
         list_rooms()
         rid = safe_int("Room ID: ")
-        rows = DB.execute("SELECT check_in, check_out, status FROM bookings WHERE room_id=%s", (rid,), fetchall=True)
         print("Bookings for room:")
-        for r in rows or []:
-            print(r['check_in'], "to", r['check_out'], r['status'])
+        for check_in, check_out, status in DB.iterate("SELECT check_in, check_out, status FROM bookings WHERE room_id=%s", (rid,)):
+            print(check_in, "to", check_out, status)
     except Exception as e:
         print("Calendar error:", e)
 
@@ -996,29 +3190,59 @@ def room_availability_calendar():
 # Automatic Inventory Deduction from Services
 # ======================================================
 
-def deduct_inventory_for_service(service_id, qty):
-    try:
-        items = DB.execute("SELECT * FROM inventory", fetchall=True)
-        for item in items or []:
-            if item['quantity'] >= qty:
-                new_qty = item['quantity'] - qty
-                DB.execute("UPDATE inventory SET quantity=%s WHERE id=%s", (new_qty, item['id']), commit=True)
-                break
-    except Exception:
-        pass
+# service_inventory is the bill of materials: how many of each inventory
+# item one unit of a service uses.
 
-# override order_service to include deduction
-old_order_service = order_service
+def save_service_component(sid, iid, qty):
+    if qty <= 0:
+        raise HotelError("Quantity must be positive")
+    with DB.transaction():
+        DB.execute("INSERT INTO service_inventory VALUES (%s,%s,%s) ON DUPLICATE KEY UPDATE quantity=VALUES(quantity)", (sid, iid, qty))
 
-def order_service():
+
+def add_service_component():
     try:
-        old_order_service()
-        sid = safe_int("Service ID again for inventory deduction: ")
-        qty = safe_int("Quantity again: ")
-        deduct_inventory_for_service(sid, qty)
-        print("Inventory updated for service usage")
+        list_services()
+        sid = safe_int("Service ID: ")
+        list_inventory()
+        iid = safe_int("Inventory ID: ")
+        save_service_component(sid, iid, safe_int("Quantity per service: "))
+        print("Component saved")
+    except HotelError as e:
+        print(e)
     except Exception as e:
-        print("Service order extended error:", e)
+        print("Component error:", e)
+
+
+def list_service_components():
+    sql = ("SELECT si.service_id, s.name, si.item_id, i.item, si.quantity FROM service_inventory si "
+           "LEFT JOIN services s ON s.id=si.service_id LEFT JOIN inventory i ON i.id=si.item_id "
+           "ORDER BY si.service_id, si.item_id")
+    for r in DB.iterate(sql):
+        print(*r)
+
+
+def deduct_inventory_for_service(service_id, qty):
+    # Takes every component of the service off stock in one conditional UPDATE
+    # and logs the usage with one INSERT ... SELECT. Called inside the order's
+    # transaction: if any item is short, fewer rows change than the service
+    # has components and the whole order rolls back.
+    with DB.transaction():
+        need = DB.execute("SELECT COUNT(*) AS c FROM service_inventory WHERE service_id=%s", (service_id,), fetchone=True)['c']
+        if not need:
+            return 0
+        changed = DB.execute(
+            "UPDATE inventory i JOIN service_inventory si ON si.item_id=i.id "
+            "SET i.quantity=i.quantity-si.quantity*%s "
+            "WHERE si.service_id=%s AND i.quantity>=si.quantity*%s",
+            (qty, service_id, qty), rowcount=True)
+        if changed != need:
+            raise HotelError("Insufficient stock for this service")
+        DB.execute(
+            "INSERT INTO inventory_usage (item_id, quantity, used_on) "
+            "SELECT item_id, quantity*%s, NOW() FROM service_inventory WHERE service_id=%s",
+            (qty, service_id))
+    return need
 
 # ======================================================
 # Final Extended Menus
@@ -1044,10 +3268,12 @@ def attendance_payroll_menu():
 
 def calendar_menu():
     while True:
-        print("1.View Room Calendar 2.Back")
+        print("1.View Room Calendar 2.Free Rooms 3.Occupancy Grid 4.Back")
         c = safe_input("Choice: ")
         if c == '1': room_availability_calendar()
-        elif c == '2': break
+        elif c == '2': search_free_rooms()
+        elif c == '3': occupancy_grid()
+        elif c == '4': break
 
 # ======================================================
 # Main Menu
@@ -1099,6 +3325,495 @@ def main_menu():
                 print("Access denied for reports")
         elif c == '8': logout()
         elif c == '9': break
+    LOG_WRITER.close()
+    DB.close_all()
+
+# ======================================================
+# Bulk Import
+# ======================================================
+
+# rows per transaction; a chunk that fails is retried row by row so only
+# the bad rows end up in the reject file
+IMPORT_CHUNK = 5000
+ROOM_STATUSES = ('available', 'reserved', 'checked_in', 'maintenance')
+BOOKING_STATUSES = ('reserved', 'checked_in', 'checked_out', 'cancelled')
+
+
+def text_field(value, required=True):
+    value = (value or '').strip() if isinstance(value, str) or value is None else str(value)
+    if required and not value:
+        raise ValueError("missing value")
+    return value
+
+
+def number_field(value, kind=float, default=None):
+    if value is None or str(value).strip() == '':
+        if default is None:
+            raise ValueError("missing value")
+        return default
+    number = kind(value)
+    if number < 0:
+        raise ValueError("negative value")
+    return number
+
+
+def choice_field(value, choices, default):
+    value = (value or '').strip().lower() if not isinstance(value, (int, float)) else str(value)
+    if not value:
+        return default
+    if value not in choices:
+        raise ValueError("must be one of " + ", ".join(choices))
+    return value
+
+
+class RoomImport:
+    sql = "INSERT INTO rooms (room_no, room_type, price, status) VALUES (%s,%s,%s,%s)"
+
+    def __init__(self):
+        self.seen = set(r['room_no'] for r in DB.execute("SELECT room_no FROM rooms", fetchall=True) or [])
+
+    def clean(self, raw):
+        room_no = text_field(raw.get('room_no'))
+        if room_no in self.seen:
+            raise ValueError("room_no " + room_no + " already exists")
+        row = (room_no, text_field(raw.get('room_type')), number_field(raw.get('price')),
+               choice_field(raw.get('status'), ROOM_STATUSES, 'available'))
+        self.seen.add(room_no)
+        return row
+
+    def loaded(self, rows):
+        pass
+
+    def dropped(self, rows):
+        # rows that failed to insert free their room numbers again
+        for r in rows:
+            self.seen.discard(r[0])
+
+    def finish(self):
+        REF_CACHE.invalidate('rooms')
+        AVAILABILITY.invalidate()
+        FORECAST.invalidate()
+
+
+class CustomerImport:
+    sql = "INSERT INTO customers (name, phone, email) VALUES (%s,%s,%s)"
+
+    def clean(self, raw):
+        email = text_field(raw.get('email'), required=False)
+        if email and '@' not in email:
+            raise ValueError("bad email")
+        return (text_field(raw.get('name')), text_field(raw.get('phone'), required=False), email)
+
+    def loaded(self, rows):
+        pass
+
+    def dropped(self, rows):
+        pass
+
+    def finish(self):
+        CUSTOMER_INDEX.changed()
+
+
+class BookingImport:
+    sql = "INSERT INTO bookings (customer_id, room_id, check_in, check_out, status, total) VALUES (%s,%s,%s,%s,%s,%s)"
+
+    def __init__(self):
+        self.customers = set(r[0] for r in DB.iterate("SELECT id FROM customers"))
+        self.rooms = REF_CACHE.rows('rooms')
+        # open stays (reserved / checked_in) from this file, per room: starts
+        # and ends in start order. They never overlap each other, so the ends
+        # are in order too and a clash is one bisect, as in AvailabilityIndex.
+        self.held = {}
+
+    def overlaps(self, rid, start, end):
+        starts, ends = self.held.get(rid, ((), ()))
+        i = bisect.bisect_right(starts, end)
+        return i > 0 and ends[i - 1] >= start
+
+    def hold(self, rid, start, end):
+        starts, ends = self.held.setdefault(rid, ([], []))
+        i = bisect.bisect_right(starts, start)
+        starts.insert(i, start)
+        ends.insert(i, end)
+
+    def clean(self, raw):
+        cid = number_field(raw.get('customer_id'), int)
+        rid = number_field(raw.get('room_id'), int)
+        if cid not in self.customers:
+            raise ValueError("unknown customer_id %d" % cid)
+        if rid not in self.rooms:
+            raise ValueError("unknown room_id %d" % rid)
+        start = to_datetime(text_field(raw.get('check_in')))
+        end = to_datetime(text_field(raw.get('check_out'), required=False))
+        if end is not None and end < start:
+            raise ValueError("check_out before check_in")
+        status = choice_field(raw.get('status'), BOOKING_STATUSES, 'reserved' if end is None or end > datetime.datetime.now() else 'checked_out')
+        total = number_field(raw.get('total'), float, 0.0)
+        if status in ('reserved', 'checked_in'):
+            until = end or datetime.datetime.max
+            if self.overlaps(rid, start, until) or not AVAILABILITY.is_free(rid, start, until):
+                raise ValueError("room %d already booked for these dates" % rid)
+            self.hold(rid, start, until)
+        return (cid, rid, start, end, status, total)
+
+    def loaded(self, rows):
+        # same side effects as book_room / checkout, once per chunk
+        held = [(r[4], r[1]) for r in rows if r[4] in ('reserved', 'checked_in')]
+        if held:
+            DB.executemany("UPDATE rooms SET status=%s WHERE id=%s", held)
+        revenue = {}
+        for r in rows:
+            if r[4] == 'checked_out' and r[5]:
+                key = ((r[3] or r[2]).date(), self.rooms[r[1]]['room_type'] or '')
+                revenue[key] = revenue.get(key, 0) + r[5]
+        if revenue:
+            DB.executemany(
+                "INSERT INTO daily_revenue (day, room_type, room_revenue) VALUES (%s,%s,%s) "
+                "ON DUPLICATE KEY UPDATE room_revenue=room_revenue+VALUES(room_revenue)",
+                [(day, room_type, amount) for (day, room_type), amount in revenue.items()])
+
+    def dropped(self, rows):
+        # rows that failed to insert no longer block later rows of the file
+        for r in rows:
+            if r[4] in ('reserved', 'checked_in'):
+                starts, ends = self.held.get(r[1], ([], []))
+                i = bisect.bisect_left(starts, r[2])
+                if i < len(starts) and starts[i] == r[2]:
+                    del starts[i]
+                    del ends[i]
+
+    def finish(self):
+        AVAILABILITY.invalidate()
+        FORECAST.invalidate()
+        REF_CACHE.invalidate('rooms')
+
+
+IMPORTERS = {'rooms': RoomImport, 'customers': CustomerImport, 'bookings': BookingImport}
+
+
+def file_format(path, fmt=None):
+    if fmt:
+        return fmt
+    ext = os.path.splitext(path)[1].lower()
+    return 'csv' if ext == '.csv' else 'json'
+
+
+def read_records(f, fmt):
+    # dicts, one per row, without reading the file into memory (a JSON array
+    # is the exception: the json module can only load it whole)
+    if fmt == 'csv':
+        for raw in csv.DictReader(f):
+            yield raw
+        return
+    first = f.read(1)
+    while first and first.isspace():
+        first = f.read(1)
+    if first == '[':
+        for raw in json.loads(first + f.read()):
+            yield raw
+        return
+    pending = first
+    for line in f:
+        line = (pending + line).strip()
+        pending = ''
+        if line:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                yield line
+
+
+class RejectFile:
+    # bad rows in the input's own format plus an "error" column, so the file
+    # can be fixed and imported again
+    def __init__(self, path, fmt):
+        self.path = path
+        self.fmt = fmt
+        self.f = None
+        self.writer = None
+        self.count = 0
+
+    def write(self, raw, error):
+        if self.f is None:
+            self.f = open(self.path, "w", newline="", encoding="utf-8")
+            if self.fmt == 'csv':
+                self.writer = csv.DictWriter(self.f, list(raw.keys()) + ['error'], extrasaction='ignore')
+                self.writer.writeheader()
+        record = dict(raw) if isinstance(raw, dict) else {'line': raw}
+        record['error'] = str(error)
+        if self.writer:
+            self.writer.writerow(record)
+        else:
+            self.f.write(json.dumps(record, default=str) + "\n")
+        self.count += 1
+
+    def close(self):
+        if self.f:
+            self.f.close()
+
+
+def load_chunk(importer, chunk, rejects):
+    rows = [row for row, _ in chunk]
+    try:
+        with DB.transaction():
+            DB.executemany(importer.sql, rows)
+            importer.loaded(rows)
+        return len(rows)
+    except Exception:
+        pass  # find the offending rows one at a time below
+    loaded = 0
+    for row, raw in chunk:
+        try:
+            with DB.transaction():
+                DB.execute(importer.sql, row)
+                importer.loaded([row])
+            loaded += 1
+        except Exception as e:
+            importer.dropped([row])
+            rejects.write(raw, e)
+    return loaded
+
+
+def import_file(table, path, fmt=None, reject_path=None, chunk_size=IMPORT_CHUNK):
+    fmt = file_format(path, fmt)
+    importer = IMPORTERS[table]()
+    rejects = RejectFile(reject_path or path + ".rejects", fmt)
+    started = time.perf_counter()
+    read = loaded = 0
+    chunk = []
+    try:
+        with open(path, newline="" if fmt == 'csv' else None, encoding="utf-8") as f:
+            for raw in read_records(f, fmt):
+                read += 1
+                try:
+                    if not isinstance(raw, dict):
+                        raise ValueError("not a JSON object")
+                    chunk.append((importer.clean(raw), raw))
+                except (ValueError, TypeError, AttributeError) as e:
+                    rejects.write(raw, e)
+                if len(chunk) >= chunk_size:
+                    loaded += load_chunk(importer, chunk, rejects)
+                    chunk = []
+                    elapsed = time.perf_counter() - started
+                    print("  %d read, %d loaded, %d rejected (%.0f rows/s)" % (read, loaded, rejects.count, read / elapsed if elapsed else 0))
+            if chunk:
+                loaded += load_chunk(importer, chunk, rejects)
+    finally:
+        rejects.close()
+        importer.finish()
+    elapsed = time.perf_counter() - started
+    return {'read': read, 'loaded': loaded, 'rejected': rejects.count, 'seconds': elapsed,
+            'rejects': rejects.path if rejects.count else None}
+
+
+def print_import(table, path, fmt=None, reject_path=None):
+    try:
+        r = import_file(table, path, fmt, reject_path)
+        print("Imported %d of %d %s in %.1f s (%.0f rows/s)" % (
+            r['loaded'], r['read'], table, r['seconds'], r['read'] / r['seconds'] if r['seconds'] else 0))
+        if r['rejects']:
+            print(r['rejected'], "rejected rows written to", r['rejects'])
+    except Exception as e:
+        print("Import error:", e)
+
+# ======================================================
+# Bulk Export
+# ======================================================
+
+# rows per Parquet row group; CSV / JSON Lines are written row by row
+EXPORT_BATCH = 10000
+
+EXPORT_REPORTS = {
+    'bookings': (
+        "SELECT b.id, b.customer_id, c.name AS customer, b.room_id, r.room_no, r.room_type, "
+        "b.check_in, b.check_out, b.status, b.total FROM bookings b "
+        "LEFT JOIN customers c ON c.id=b.customer_id LEFT JOIN rooms r ON r.id=b.room_id "
+        "WHERE b.check_in >= COALESCE(%s, '1000-01-01') AND b.check_in < COALESCE(%s, '9999-12-31') "
+        "ORDER BY b.check_in, b.id"),
+    'payroll': (
+        "SELECT p.employee_id, e.name, e.role, p.month, p.year, p.amount FROM payroll p "
+        "LEFT JOIN employees e ON e.id=p.employee_id "
+        "WHERE (%s IS NULL OR p.month=%s) AND (%s IS NULL OR p.year=%s) "
+        "ORDER BY p.year, p.month, p.employee_id"),
+    'inventory-usage': (
+        "SELECT u.id, u.item_id, i.item, u.quantity, u.used_on FROM inventory_usage u "
+        "LEFT JOIN inventory i ON i.id=u.item_id "
+        "WHERE u.used_on >= COALESCE(%s, '1000-01-01') AND u.used_on < COALESCE(%s, '9999-12-31') "
+        "ORDER BY u.used_on, u.id"),
+}
+
+
+def export_query(source, start=None, end=None, month=None, year=None):
+    if source == 'payroll':
+        return EXPORT_REPORTS[source], (month, month, year, year)
+    if source in EXPORT_REPORTS:
+        # `end` is inclusive: compare against the following midnight
+        until = to_datetime(end) + datetime.timedelta(days=1) if end else None
+        return EXPORT_REPORTS[source], (to_datetime(start), until)
+    tables = [r['t'] for r in DB.execute(
+        "SELECT table_name AS t FROM information_schema.tables WHERE table_schema=DATABASE()", fetchall=True) or []]
+    if source not in tables:
+        raise HotelError("Unknown table or report: " + source)
+    return "SELECT * FROM `" + source + "`", ()
+
+
+def export_format(path, fmt=None):
+    if fmt:
+        return fmt
+    ext = os.path.splitext(path)[1].lower()
+    if ext == '.csv':
+        return 'csv'
+    if ext == '.parquet':
+        return 'parquet'
+    return 'jsonl'
+
+
+def write_parquet(path, columns, rows):
+    # one row group per EXPORT_BATCH rows. Column types come from the first
+    # batch; a column that is all NULL there is written as text.
+    writer = None
+    count = 0
+    batch = []
+
+    def flush():
+        nonlocal writer
+        data = list(zip(*batch))
+        if writer is None:
+            probe = pyarrow.Table.from_pydict(dict((c, list(v)) for c, v in zip(columns, data)))
+            fields = [pyarrow.field(f.name, pyarrow.string()) if pyarrow.types.is_null(f.type) else f for f in probe.schema]
+            writer = pyarrow.parquet.ParquetWriter(path, pyarrow.schema(fields))
+        arrays = []
+        for field, values in zip(writer.schema, data):
+            if pyarrow.types.is_string(field.type):
+                values = [None if v is None else str(v) for v in values]
+            arrays.append(pyarrow.array(values, type=field.type))
+        writer.write_table(pyarrow.Table.from_arrays(arrays, schema=writer.schema))
+
+    try:
+        for row in rows:
+            batch.append(row)
+            count += 1
+            if len(batch) >= EXPORT_BATCH:
+                flush()
+                batch = []
+        if batch:
+            flush()
+        elif writer is None:
+            # no rows at all: still leave a file with the column names
+            writer = pyarrow.parquet.ParquetWriter(path, pyarrow.schema([(c, pyarrow.string()) for c in columns]))
+    finally:
+        if writer is not None:
+            writer.close()
+    return count
+
+
+def export(source, path, fmt=None, start=None, end=None, month=None, year=None):
+    fmt = export_format(path, fmt)
+    if fmt == 'parquet' and pyarrow is None:
+        raise HotelError("Parquet export needs the pyarrow package")
+    query, params = export_query(source, start, end, month, year)
+    rows = DB.iterate(query, params, batch_size=EXPORT_BATCH, header=True, strict=True)
+    columns = next(rows)
+    if fmt == 'parquet':
+        try:
+            return write_parquet(path, columns, rows)
+        finally:
+            rows.close()
+    count = 0
+    out = sys.stdout if path == '-' else open(path, "w", newline="", encoding="utf-8")
+    try:
+        if fmt == 'csv':
+            writer = csv.writer(out)
+            writer.writerow(columns)
+            for row in rows:
+                writer.writerow(row)
+                count += 1
+        else:
+            for row in rows:
+                out.write(json.dumps(dict(zip(columns, row)), default=str) + "\n")
+                count += 1
+    finally:
+        rows.close()
+        if out is not sys.stdout:
+            out.close()
+    return count
+
+
+def print_export(source, path, fmt=None, start=None, end=None, month=None, year=None):
+    try:
+        started = time.perf_counter()
+        count = export(source, path, fmt, start, end, month, year)
+        if path != '-':
+            print("Exported %d rows of %s to %s in %.1f s" % (count, source, path, time.perf_counter() - started))
+    except Exception as e:
+        print("Export error:", e, file=sys.stderr)
+
+# ======================================================
+# Command Line
+# ======================================================
+
+def run_cli(argv):
+    # no command: the interactive menu; otherwise a single headless command
+    parser = argparse.ArgumentParser(prog="thismightbeit.py")
+    parser.add_argument("--profile", action="store_true",
+                        help="time every statement into %s; log slow ones to %s" % (QUERY_PROFILE_LOG, SLOW_QUERY_LOG))
+    parser.add_argument("--slow-ms", type=float, default=SLOW_QUERY_MS, metavar="MS",
+                        help="with --profile, the slow-query threshold (default %(default)g)")
+    commands = parser.add_subparsers(dest="command")
+    dash = commands.add_parser("dashboard", help="occupancy / revenue / cost summary")
+    dash.add_argument("--watch", nargs="?", type=float, const=5.0, default=None, metavar="SECONDS",
+                      help="refresh every SECONDS (default 5) until Ctrl+C")
+    commands.add_parser("rebuild-revenue", help="backfill daily_revenue from bookings, orders, payments and cancellations")
+    load = commands.add_parser("import", help="bulk load rooms, customers or bookings from CSV / JSON")
+    load.add_argument("table", choices=sorted(IMPORTERS))
+    load.add_argument("file")
+    load.add_argument("--format", choices=["csv", "json"], help="default: from the file extension (.jsonl/.json are JSON)")
+    load.add_argument("--rejects", metavar="FILE", help="where bad rows go (default FILE.rejects)")
+    dump = commands.add_parser("export", help="stream a table or report to CSV, JSON Lines or Parquet")
+    dump.add_argument("source", help="a table name or one of: " + ", ".join(sorted(EXPORT_REPORTS)))
+    dump.add_argument("file", help="output path, '-' for stdout")
+    dump.add_argument("--format", choices=["csv", "jsonl", "parquet"], help="default: from the file extension")
+    dump.add_argument("--from", dest="start", metavar="YYYY-MM-DD", help="bookings / inventory-usage: first day")
+    dump.add_argument("--to", dest="end", metavar="YYYY-MM-DD", help="bookings / inventory-usage: last day")
+    dump.add_argument("--month", type=int, help="payroll: month")
+    dump.add_argument("--year", type=int, help="payroll: year")
+    snap = commands.add_parser("snapshot", help="consistent copy of some or all tables")
+    snap.add_argument("tables", nargs="*")
+    snap.add_argument("--incremental", action="store_true", help="copy only id ranges changed since the last snapshot")
+    back = commands.add_parser("restore", help="swap tables back to a snapshot")
+    back.add_argument("snapshot", type=int)
+    back.add_argument("tables", nargs="*")
+    commands.add_parser("snapshots", help="list snapshots")
+    stats = commands.add_parser("query-stats", help="p50/p95/p99 statement time per call site")
+    stats.add_argument("file", nargs="?", default=QUERY_PROFILE_LOG)
+    args = parser.parse_args(argv)
+    if args.profile:
+        QUERY_PROFILER.start(args.slow_ms)
+    if args.command is None:
+        main_menu()
+        return
+    try:
+        if args.command == "dashboard":
+            report_dashboard(watch=args.watch is not None, interval=args.watch or 5)
+        elif args.command == "rebuild-revenue":
+            rebuild_revenue_rollup()
+        elif args.command == "import":
+            print_import(args.table, args.file, args.format, args.rejects)
+        elif args.command == "export":
+            print_export(args.source, args.file, args.format, args.start, args.end, args.month, args.year)
+        elif args.command == "snapshot":
+            snapshot_tables(args.tables, args.incremental)
+        elif args.command == "restore":
+            restore_tables(args.snapshot, args.tables)
+        elif args.command == "snapshots":
+            list_snapshots()
+        elif args.command == "query-stats":
+            print_query_stats(args.file)
+        else:
+            parser.print_help()
+    finally:
+        LOG_WRITER.close()
+        DB.close_all()
 
 if __name__ == '__main__':
-    main_menu()
+    run_cli(sys.argv[1:])
@@ -4,6 +4,14 @@
 # Class XII Section A, DPS Panipat Refinery
 # Technology: Python + MySQL (mysql.connector only)
 
+import atexit
+import datetime
+import queue
+import threading
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+
 import mysql.connector
 from mysql.connector import errorcode
 
@@ -48,9 +56,22 @@ def safe_float(msg):
 # Database Engine
 # ==============================================================
 
+# connections kept open between queries; a checkout blocks once all are in use
+POOL_SIZE = 5
+# an idle connection released less than this many seconds ago is handed out
+# without a ping round trip
+PING_AFTER = 1.0
+
+
 class Database:
-    def __init__(self, config):
+    def __init__(self, config, pool_size=POOL_SIZE):
         self.config = config
+        self.pool_size = pool_size
+        self.idle = []
+        self.opened = 0
+        self.lock = threading.Condition()
+        self.local = threading.local()
+        self.stats = {'checkouts': 0, 'waits': 0, 'handshakes': 0, 'handshakes_avoided': 0, 'reconnects': 0}
 
     def connect(self):
         try:
@@ -63,32 +84,243 @@ class Database:
             else:
                 raise RuntimeError(str(e))
 
+    def acquire(self):
+        with self.lock:
+            self.stats['checkouts'] += 1
+            if not self.idle and self.opened >= self.pool_size:
+                self.stats['waits'] += 1
+                while not self.idle and self.opened >= self.pool_size:
+                    self.lock.wait()
+            if self.idle:
+                conn, released = self.idle.pop()
+            else:
+                conn, released = None, 0
+                self.opened += 1
+        if conn is not None:
+            try:
+                if time.monotonic() - released > PING_AFTER:
+                    conn.ping(reconnect=False)
+                with self.lock:
+                    self.stats['handshakes_avoided'] += 1
+                return conn
+            except Exception:
+                # dead connection (server restart, wait_timeout): replace it
+                self.close_quietly(conn)
+                with self.lock:
+                    self.stats['reconnects'] += 1
+        try:
+            conn = self.connect()
+        except Exception:
+            with self.lock:
+                self.opened -= 1
+                self.lock.notify()
+            raise
+        with self.lock:
+            self.stats['handshakes'] += 1
+        return conn
+
+    def release(self, conn, discard=False):
+        if not discard:
+            try:
+                # never hand an open transaction (or read snapshot) to the next caller
+                if conn.in_transaction:
+                    conn.rollback()
+            except Exception:
+                discard = True
+        if discard:
+            self.close_quietly(conn)
+        with self.lock:
+            if discard:
+                self.opened -= 1
+            else:
+                self.idle.append((conn, time.monotonic()))
+            self.lock.notify()
+
+    def close_quietly(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def close_all(self):
+        with self.lock:
+            idle, self.idle = self.idle, []
+            self.opened -= len(idle)
+        for conn, _ in idle:
+            self.close_quietly(conn)
+
+    def pool_stats(self):
+        with self.lock:
+            stats = dict(self.stats)
+            stats['open'] = self.opened
+            stats['idle'] = len(self.idle)
+        return stats
+
+    def run(self, conn, query, params, fetchone, fetchall):
+        cur = conn.cursor(dictionary=True, buffered=True)
+        cur.execute(query, params or ())
+        result = None
+        if fetchone:
+            result = cur.fetchone()
+        if fetchall:
+            result = cur.fetchall()
+        cur.close()
+        return result
+
     def execute(self, query, params=None, fetchone=False, fetchall=False, commit=False):
+        tx = getattr(self.local, 'conn', None)
+        if tx is not None:
+            # inside transaction(): share its connection, leave the commit to
+            # the end of the block and let errors reach it so it rolls back
+            try:
+                return self.run(tx, query, params, fetchone, fetchall)
+            except Exception as e:
+                raise RuntimeError("Database error: " + str(e))
         conn = None
         try:
-            conn = self.connect()
-            cur = conn.cursor(dictionary=True)
-            cur.execute(query, params or ())
-            result = None
-            if fetchone:
-                result = cur.fetchone()
-            if fetchall:
-                result = cur.fetchall()
+            conn = self.acquire()
+            result = self.run(conn, query, params, fetchone, fetchall)
             if commit:
                 conn.commit()
-            cur.close()
-            conn.close()
+            self.release(conn)
             return result
         except Exception as e:
+            broken = False
             try:
                 if conn:
                     conn.rollback()
             except Exception:
-                pass
+                broken = True
+            if conn:
+                self.release(conn, discard=broken)
             raise RuntimeError("Database error: " + str(e))
 
+    def executemany(self, query, rows, commit=False):
+        rows = list(rows)
+        if not rows:
+            return 0
+        tx = getattr(self.local, 'conn', None)
+        conn = tx
+        try:
+            if conn is None:
+                conn = self.acquire()
+            cur = conn.cursor()
+            cur.executemany(query, rows)
+            count = cur.rowcount
+            cur.close()
+            if tx is None:
+                if commit:
+                    conn.commit()
+                self.release(conn)
+            return count
+        except Exception as e:
+            if tx is None and conn:
+                broken = False
+                try:
+                    conn.rollback()
+                except Exception:
+                    broken = True
+                self.release(conn, discard=broken)
+            raise RuntimeError("Database error: " + str(e))
+
+    @contextmanager
+    def transaction(self):
+        # run every DB.execute in the block on one connection with one commit;
+        # an exception rolls the whole block back. Nested blocks join the outer one.
+        if getattr(self.local, 'conn', None) is not None:
+            yield self.local.conn
+            return
+        conn = self.acquire()
+        self.local.conn = conn
+        ok = False
+        try:
+            yield conn
+            conn.commit()
+            ok = True
+        finally:
+            self.local.conn = None
+            broken = False
+            if not ok:
+                try:
+                    conn.rollback()
+                except Exception:
+                    broken = True
+            self.release(conn, discard=broken)
+
 DB = Database(DB_CONFIG)
 
+# ==============================================================
+# Reference Data Cache
+# ==============================================================
+
+# Small, rarely written tables are read through this cache. Entries expire
+# after CACHE_TTL seconds (other desks may write too) and the add_* screens
+# invalidate their table straight away.
+CACHE_TTL = 300
+
+
+class ReferenceCache:
+    def __init__(self, tables, ttl=CACHE_TTL):
+        self.tables = tables
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.data = {}
+        self.hits = dict((t, 0) for t in tables)
+        self.misses = dict((t, 0) for t in tables)
+
+    def load(self, table):
+        # the cached {id: row} itself; only get() adds to it, under the lock
+        with self.lock:
+            entry = self.data.get(table)
+            if entry and time.monotonic() - entry[0] < self.ttl:
+                self.hits[table] += 1
+                return entry[1]
+            self.misses[table] += 1
+        rows = DB.execute(self.tables[table], fetchall=True)
+        if rows is None:
+            return {}
+        by_id = dict((r['id'], r) for r in rows)
+        with self.lock:
+            self.data[table] = (time.monotonic(), by_id)
+        return by_id
+
+    def rows(self, table):
+        # {id: row} for the whole table, as a copy callers may iterate or
+        # change while get() keeps filling the cached one
+        by_id = self.load(table)
+        with self.lock:
+            return dict(by_id)
+
+    def get(self, table, row_id):
+        # a row another desk added since the last load is fetched by id and
+        # kept, so a new id is not mistaken for a missing one
+        rows = self.load(table)
+        with self.lock:
+            row = rows.get(row_id)
+        if row is None and row_id is not None:
+            row = DB.execute(self.tables[table] + " WHERE id=%s", (row_id,), fetchone=True)
+            if row:
+                with self.lock:
+                    rows[row_id] = row
+        return row
+
+    def invalidate(self, table):
+        with self.lock:
+            self.data.pop(table, None)
+
+    def stats(self):
+        with self.lock:
+            return dict((t, (self.hits[t], self.misses[t])) for t in self.tables)
+
+
+REF_CACHE = ReferenceCache({
+    'services': "SELECT id, hotel_id, name, price FROM services",
+    'taxes': "SELECT id, country, rate FROM taxes",
+    'currencies': "SELECT id, code, rate_to_usd FROM currencies",
+    # no status column: it changes with every booking
+    'rooms': "SELECT id, hotel_id, room_number, room_type, price FROM rooms",
+})
+
 # ==============================================================
 # Core Schema
 # ==============================================================
@@ -109,14 +341,40 @@ CORE_SCHEMA = [
     "CREATE TABLE IF NOT EXISTS shifts (id INT AUTO_INCREMENT PRIMARY KEY, employee_id INT, work_date DATE, start_time TIME, end_time TIME)",
     "CREATE TABLE IF NOT EXISTS taxes (id INT AUTO_INCREMENT PRIMARY KEY, country VARCHAR(100), rate FLOAT)",
     "CREATE TABLE IF NOT EXISTS currencies (id INT AUTO_INCREMENT PRIMARY KEY, code VARCHAR(10), rate_to_usd FLOAT)",
-    "CREATE TABLE IF NOT EXISTS cancellations (id INT AUTO_INCREMENT PRIMARY KEY, booking_id INT, reason TEXT, refund_amount FLOAT)",
-    "CREATE TABLE IF NOT EXISTS audit_logs (id INT AUTO_INCREMENT PRIMARY KEY, action VARCHAR(200), user VARCHAR(50), log_time DATETIME DEFAULT NOW())"
+    "CREATE TABLE IF NOT EXISTS cancellations (id INT AUTO_INCREMENT PRIMARY KEY, booking_id INT, reason TEXT, refund_amount FLOAT, cancelled_on DATETIME)",
+    "CREATE TABLE IF NOT EXISTS payments (id INT AUTO_INCREMENT PRIMARY KEY, invoice_id INT, amount FLOAT, pay_time DATETIME)",
+    "CREATE TABLE IF NOT EXISTS audit_logs (id INT AUTO_INCREMENT PRIMARY KEY, action VARCHAR(200), user VARCHAR(50), log_time DATETIME DEFAULT NOW())",
+    "CREATE TABLE IF NOT EXISTS daily_revenue (day DATE, hotel_id INT, room_type VARCHAR(50), room_revenue DOUBLE DEFAULT 0, payments DOUBLE DEFAULT 0, refunds DOUBLE DEFAULT 0, PRIMARY KEY (day, hotel_id, room_type))"
+]
+
+# Columns added after the first release and secondary indexes for the room
+# search. MySQL has no ADD COLUMN / CREATE INDEX IF NOT EXISTS, so run_ddl
+# skips whatever an earlier start already added.
+CORE_CHANGES = [
+    "ALTER TABLE cancellations ADD COLUMN cancelled_on DATETIME",
+    "CREATE INDEX idx_rooms_hotel_type_price ON rooms (hotel_id, room_type, price)",
+    "CREATE INDEX idx_rooms_type_price ON rooms (room_type, price)",
+    "CREATE INDEX idx_hotels_branch ON hotels (branch_id)",
+    "CREATE INDEX idx_bookings_room_status_in ON bookings (room_id, status, check_in)",
 ]
 
 # ==============================================================
 # Initialization
 # ==============================================================
 
+def run_ddl(stmt):
+    conn = DB.acquire()
+    try:
+        cur = conn.cursor()
+        cur.execute(stmt)
+        cur.close()
+    except mysql.connector.Error as e:
+        if e.errno not in (errorcode.ER_DUP_KEYNAME, errorcode.ER_DUP_FIELDNAME):
+            raise
+    finally:
+        DB.release(conn)
+
+
 def initialize_database():
     try:
         base = mysql.connector.connect(host=DB_CONFIG['host'], user=DB_CONFIG['user'], password=DB_CONFIG['password'])
@@ -128,6 +386,10 @@ def initialize_database():
 
         for stmt in CORE_SCHEMA:
             DB.execute(stmt, commit=True)
+        for stmt in CORE_CHANGES:
+            run_ddl(stmt)
+        if not DB.execute("SELECT 1 AS x FROM daily_revenue LIMIT 1", fetchone=True):
+            rebuild_daily_revenue()
 
         DB.execute("INSERT IGNORE INTO users (username,password,role) VALUES ('admin','admin','administrator')", commit=True)
         print("Database initialized.")
@@ -164,6 +426,7 @@ def logout():
     if current_user:
         log_action("Logout")
     current_user = None
+    LOG_WRITER.flush()
 
 
 def add_user():
@@ -198,15 +461,116 @@ def auth_menu():
 # Audit Logs
 # ==============================================================
 
+# Log rows are written by a background thread in multi-row INSERTs once
+# LOG_BATCH rows are waiting or LOG_FLUSH_SECONDS have passed. When
+# LOG_QUEUE_SIZE rows are already waiting, new events are dropped (and
+# counted) instead of blocking the desk.
+LOG_QUEUE_SIZE = 10000
+LOG_BATCH = 200
+LOG_FLUSH_SECONDS = 2.0
+
+
+class LogWriter:
+    def __init__(self, query):
+        self.query = query
+        self.queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+        self.lock = threading.Lock()
+        self.thread = None
+        self.stopping = False
+        self.dropped = 0
+        self.written = 0
+        self.failed = 0
+        self.batches = 0
+
+    def start(self):
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.stopping = False
+                self.thread = threading.Thread(target=self.run, name="log-writer", daemon=True)
+                self.thread.start()
+
+    def submit(self, row):
+        self.start()
+        try:
+            self.queue.put_nowait(row)
+        except queue.Full:
+            with self.lock:
+                self.dropped += 1
+
+    def write(self, rows):
+        try:
+            count = DB.executemany(self.query, rows, commit=True)
+        except Exception:
+            count = None
+        with self.lock:
+            if count is None:
+                self.failed += len(rows)
+            else:
+                self.written += len(rows)
+                self.batches += 1
+        for _ in rows:
+            self.queue.task_done()
+
+    def run(self):
+        while not self.stopping:
+            try:
+                rows = [self.queue.get(timeout=LOG_FLUSH_SECONDS)]
+            except queue.Empty:
+                continue
+            deadline = time.monotonic() + LOG_FLUSH_SECONDS
+            while len(rows) < LOG_BATCH:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    rows.append(self.queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self.write(rows)
+
+    def flush(self):
+        # write whatever is queued from this thread, then wait for the batch
+        # the writer thread may be holding
+        while True:
+            rows = []
+            while len(rows) < LOG_BATCH:
+                try:
+                    rows.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            if not rows:
+                break
+            self.write(rows)
+        self.queue.join()
+
+    def close(self):
+        self.stopping = True
+        self.flush()
+
+    def stats(self):
+        with self.lock:
+            return {'queued': self.queue.qsize(), 'written': self.written, 'batches': self.batches,
+                    'dropped': self.dropped, 'failed': self.failed}
+
+LOG_WRITER = LogWriter("INSERT INTO audit_logs (action,user,log_time) VALUES (%s,%s,%s)")
+atexit.register(LOG_WRITER.close)
+
+
 def log_action(action):
-    try:
-        user = current_user['username'] if current_user else 'system'
-        DB.execute("INSERT INTO audit_logs (action,user) VALUES (%s,%s)", (action, user), commit=True)
-    except Exception:
-        pass
+    user = current_user['username'] if current_user else 'system'
+    LOG_WRITER.submit((action, user, datetime.datetime.now()))
+
+
+def print_engine_stats():
+    s = LOG_WRITER.stats()
+    print("Log queue depth:", s['queued'], "Written:", s['written'], "in", s['batches'], "batches")
+    print("Log events dropped:", s['dropped'], "failed:", s['failed'])
+    for table, (hits, misses) in REF_CACHE.stats().items():
+        print("Cache", table, "hits:", hits, "misses:", misses)
 
 
 def list_audit_logs():
+    LOG_WRITER.flush()
     rows = DB.execute("SELECT * FROM audit_logs ORDER BY id DESC LIMIT 50", fetchall=True)
     for r in rows or []:
         print(r['log_time'], r['user'], r['action'])
@@ -237,6 +601,7 @@ def list_hotels():
 def add_room():
     list_hotels()
     DB.execute("INSERT INTO rooms VALUES (NULL,%s,%s,%s,%s,'available')", (safe_int("Hotel ID: "), safe_input("Room No: "), safe_input("Type: "), safe_float("Price: ")), commit=True)
+    REF_CACHE.invalidate('rooms')
 
 
 def list_rooms():
@@ -252,6 +617,106 @@ def list_customers():
     for r in DB.execute("SELECT * FROM customers", fetchall=True) or []:
         print(r['id'], r['name'], r['phone'])
 
+# ==============================================================
+# Room Search
+# ==============================================================
+
+ROOM_PAGE_SIZE = 20
+
+RoomPage = namedtuple('RoomPage', 'rows total page pages')
+
+# sort key -> ORDER BY; every order ends on the id so pages never overlap
+ROOM_SORTS = {
+    'price': "r.price, r.id",
+    '-price': "r.price DESC, r.id DESC",
+    'room_no': "r.room_number, r.id",
+    'type': "r.room_type, r.price, r.id",
+    'hotel': "h.name, r.price, r.id",
+}
+
+
+def room_filter(branch_id, hotel_id, room_type, low, high, status, start, end):
+    # WHERE clause and params for the facets given. Equality facets lead so
+    # the (hotel_id, room_type, price) / (room_type, price) indexes can range
+    # scan the price band; the date window is a NOT EXISTS probe on
+    # (room_id, status, check_in) per candidate room.
+    where, params = [], []
+    for column, value in (("h.branch_id", branch_id), ("r.hotel_id", hotel_id), ("r.room_type", room_type), ("r.status", status)):
+        if value is not None:
+            where.append(column + "=%s")
+            params.append(value)
+    if low is not None:
+        where.append("r.price >= %s")
+        params.append(low)
+    if high is not None:
+        where.append("r.price <= %s")
+        params.append(high)
+    if start:
+        where.append("r.status != 'maintenance' AND NOT EXISTS (SELECT 1 FROM bookings b WHERE b.room_id=r.id "
+                     "AND b.status IN ('reserved','checked_in') AND b.check_in <= %s AND (b.check_out IS NULL OR b.check_out >= %s))")
+        params.extend([end or '9999-12-31', start])
+    return (" WHERE " + " AND ".join(where)) if where else "", params
+
+
+def search_rooms(branch_id=None, hotel_id=None, room_type=None, low=None, high=None, status=None,
+                 start=None, end=None, sort='price', page=1, page_size=ROOM_PAGE_SIZE):
+    if sort not in ROOM_SORTS:
+        raise RuntimeError("Sort by one of: " + ", ".join(ROOM_SORTS))
+    where, params = room_filter(branch_id, hotel_id, room_type, low, high, status, start, end)
+    tables = " FROM rooms r LEFT JOIN hotels h ON h.id=r.hotel_id"
+    total = DB.execute("SELECT COUNT(*) AS c" + tables + where, params, fetchone=True)['c']
+    pages = max(1, -(-total // page_size))
+    page = max(1, min(page, pages))
+    rows = DB.execute(
+        "SELECT r.id, r.hotel_id, h.name AS hotel, h.branch_id, r.room_number, r.room_type, r.price, r.status"
+        + tables + where + " ORDER BY " + ROOM_SORTS[sort] + " LIMIT %s OFFSET %s",
+        params + [page_size, (page - 1) * page_size], fetchall=True) or []
+    return RoomPage(rows, total, page, pages)
+
+
+def page_rooms(**facets):
+    page = 1
+    while True:
+        result = search_rooms(page=page, **facets)
+        for r in result.rows:
+            print(r['id'], r['hotel'] or '-', r['room_number'], r['room_type'], r['price'], r['status'])
+        print("%d room(s), page %d of %d" % (result.total, result.page, result.pages))
+        if result.page >= result.pages:
+            return result.total
+        if safe_input("-- Enter: next page, q: stop -- ").strip().lower() == 'q':
+            return result.total
+        page += 1
+
+
+def optional_number(msg, cast=float):
+    while True:
+        text = safe_input(msg).strip()
+        if not text:
+            return None
+        try:
+            return cast(text)
+        except ValueError:
+            print("Enter a valid number.")
+
+
+def find_room():
+    try:
+        facets = dict(
+            branch_id=optional_number("Branch ID (blank for any): ", int),
+            hotel_id=optional_number("Hotel ID (blank for any): ", int),
+            room_type=safe_input("Room type (blank for any): ").strip() or None,
+            low=optional_number("Min price (blank for none): "),
+            high=optional_number("Max price (blank for none): "),
+            status=safe_input("Status (blank for any): ").strip() or None,
+            start=safe_input("Free from (YYYY-MM-DD, blank for any dates): ").strip() or None,
+        )
+        if facets['start']:
+            facets['end'] = safe_input("Free to (YYYY-MM-DD): ").strip() or None
+        facets['sort'] = safe_input("Sort (" + "/".join(ROOM_SORTS) + ", blank for price): ").strip() or 'price'
+        page_rooms(**facets)
+    except Exception as e:
+        print("Room search error:", e)
+
 # ==============================================================
 # Booking Engine
 # ==============================================================
@@ -259,12 +724,11 @@ def list_customers():
 def create_booking():
     list_customers()
     cid = safe_int("Customer ID: ")
-    rows = DB.execute("SELECT * FROM rooms WHERE status='available'", fetchall=True)
-    for r in rows or []:
-        print(r['id'], r['room_number'], r['price'])
+    page_rooms(status='available')
     rid = safe_int("Room ID: ")
-    DB.execute("INSERT INTO bookings VALUES (NULL,%s,%s,NOW(),NULL,'reserved',0)", (cid, rid), commit=True)
-    DB.execute("UPDATE rooms SET status='reserved' WHERE id=%s", (rid,), commit=True)
+    with DB.transaction():
+        DB.execute("INSERT INTO bookings VALUES (NULL,%s,%s,NOW(),NULL,'reserved',0)", (cid, rid))
+        DB.execute("UPDATE rooms SET status='reserved' WHERE id=%s", (rid,))
     log_action("Booking created")
 
 
@@ -283,11 +747,23 @@ def check_in():
 def check_out():
     list_bookings()
     bid = safe_int("Booking ID: ")
-    booking = DB.execute("SELECT * FROM bookings WHERE id=%s", (bid,), fetchone=True)
-    room = DB.execute("SELECT * FROM rooms WHERE id=%s", (booking['room_id'],), fetchone=True)
-    total = float(room['price'])
-    DB.execute("UPDATE bookings SET status='checked_out', check_out=NOW(), total_amount=%s WHERE id=%s", (total, bid), commit=True)
-    DB.execute("UPDATE rooms SET status='available' WHERE id=%s", (room['id'],), commit=True)
+    try:
+        with DB.transaction():
+            booking = DB.execute("SELECT * FROM bookings WHERE id=%s FOR UPDATE", (bid,), fetchone=True)
+            if not booking:
+                raise RuntimeError("invalid booking")
+            if booking['status'] not in ('reserved', 'checked_in'):
+                raise RuntimeError("booking is " + str(booking['status']))
+            room = REF_CACHE.get('rooms', booking['room_id'])
+            if not room:
+                raise RuntimeError("booking has no valid room")
+            total = float(room['price'])
+            DB.execute("UPDATE bookings SET status='checked_out', check_out=NOW(), total_amount=%s WHERE id=%s", (total, bid))
+            DB.execute("UPDATE rooms SET status='available' WHERE id=%s", (room['id'],))
+            add_revenue('room_revenue', total, room)
+    except Exception as e:
+        print("Check-out error:", e)
+        return
     log_action("Check-out")
 
 # ==============================================================
@@ -333,10 +809,11 @@ def list_payroll():
 def add_service():
     list_hotels()
     DB.execute("INSERT INTO services VALUES (NULL,%s,%s,%s)", (safe_int("Hotel ID: "), safe_input("Service: "), safe_float("Price: ")), commit=True)
+    REF_CACHE.invalidate('services')
 
 
 def list_services():
-    for r in DB.execute("SELECT * FROM services", fetchall=True) or []:
+    for r in REF_CACHE.rows('services').values():
         print(r['hotel_id'], r['name'], r['price'])
 
 
@@ -369,10 +846,13 @@ def pay_invoice():
     list_invoices()
     iid = safe_int("Invoice ID: ")
     amt = safe_float("Pay amount: ")
-    inv = DB.execute("SELECT * FROM invoices WHERE id=%s", (iid,), fetchone=True)
-    new_paid = inv['paid'] + amt
-    status = 'paid' if new_paid >= inv['amount'] else 'partial'
-    DB.execute("UPDATE invoices SET paid=%s,status=%s WHERE id=%s", (new_paid, status, iid), commit=True)
+    with DB.transaction():
+        inv = DB.execute("SELECT * FROM invoices WHERE id=%s FOR UPDATE", (iid,), fetchone=True)
+        new_paid = inv['paid'] + amt
+        status = 'paid' if new_paid >= inv['amount'] else 'partial'
+        DB.execute("UPDATE invoices SET paid=%s,status=%s WHERE id=%s", (new_paid, status, iid))
+        DB.execute("INSERT INTO payments (invoice_id, amount, pay_time) VALUES (%s,%s,NOW())", (iid, amt))
+        add_revenue('payments', amt, room_of_booking(inv['booking_id']))
 
 # ==============================================================
 # Shifts, Taxes, Currency, Cancellation
@@ -390,19 +870,21 @@ def list_shifts():
 
 def add_tax():
     DB.execute("INSERT INTO taxes VALUES (NULL,%s,%s)", (safe_input("Country: "), safe_float("Rate: ")), commit=True)
+    REF_CACHE.invalidate('taxes')
 
 
 def list_taxes():
-    for r in DB.execute("SELECT * FROM taxes", fetchall=True) or []:
+    for r in REF_CACHE.rows('taxes').values():
         print(r['country'], r['rate'])
 
 
 def add_currency():
     DB.execute("INSERT INTO currencies VALUES (NULL,%s,%s)", (safe_input("Code: "), safe_float("Rate to USD: ")), commit=True)
+    REF_CACHE.invalidate('currencies')
 
 
 def list_currencies():
-    for r in DB.execute("SELECT * FROM currencies", fetchall=True) or []:
+    for r in REF_CACHE.rows('currencies').values():
         print(r['code'], r['rate_to_usd'])
 
 
@@ -410,18 +892,28 @@ def cancel_booking():
     list_bookings()
     bid = safe_int("Booking ID: ")
     reason = safe_input("Reason: ")
-    booking = DB.execute("SELECT * FROM bookings WHERE id=%s", (bid,), fetchone=True)
-    refund = booking['total_amount'] * 0.8
-    DB.execute("INSERT INTO cancellations VALUES (NULL,%s,%s,%s)", (bid, reason, refund), commit=True)
-    DB.execute("UPDATE bookings SET status='cancelled' WHERE id=%s", (bid,), commit=True)
+    with DB.transaction():
+        booking = DB.execute("SELECT * FROM bookings WHERE id=%s FOR UPDATE", (bid,), fetchone=True)
+        refund = booking['total_amount'] * 0.8
+        DB.execute("INSERT INTO cancellations (booking_id, reason, refund_amount, cancelled_on) VALUES (%s,%s,%s,NOW())", (bid, reason, refund))
+        DB.execute("UPDATE bookings SET status='cancelled' WHERE id=%s", (bid,))
+        room = REF_CACHE.get('rooms', booking['room_id'])
+        if booking['status'] == 'checked_out' and booking['check_out']:
+            # no longer counted as room revenue, same as the old SUM over checked_out bookings
+            add_revenue('room_revenue', -booking['total_amount'], room, booking['check_out'].date())
+        add_revenue('refunds', refund, room)
 
 # ==============================================================
 # Reports
 # ==============================================================
 
 def report_revenue():
-    rows = DB.execute("SELECT SUM(total_amount) AS revenue FROM bookings WHERE status='checked_out'", fetchone=True)
-    print("Total revenue:", rows['revenue'])
+    start = safe_input("From (YYYY-MM-DD, blank for all): ").strip()
+    end = safe_input("To (YYYY-MM-DD, blank for all): ").strip()
+    rows = revenue_by_hotel(start, end)
+    for r in rows:
+        print(r['hotel'] or '-', r['room_type'] or '-', "rooms:", r['room'], "payments:", r['paid'], "refunds:", r['refunds'])
+    print("Total revenue:", sum(r['room'] or 0 for r in rows))
 
 
 def report_occupancy():
@@ -429,19 +921,80 @@ def report_occupancy():
     occ = DB.execute("SELECT COUNT(*) AS c FROM rooms WHERE status!='available'", fetchone=True)['c']
     print("Occupancy:", (occ / total * 100) if total else 0)
 
+# ==============================================================
+# Daily Revenue Rollup
+# ==============================================================
+
+# daily_revenue holds one row per (day, hotel, room type). check_out,
+# pay_invoice and cancel_booking add to it inside their own transaction, so
+# revenue reports read rollup rows instead of scanning all bookings.
+
+def add_revenue(column, amount, room, day=None):
+    # day=None means today on the server clock, the same clock NOW() uses
+    sql = ("INSERT INTO daily_revenue (day, hotel_id, room_type, " + column + ") VALUES (COALESCE(%s, CURDATE()),%s,%s,%s) "
+           "ON DUPLICATE KEY UPDATE " + column + "=" + column + "+VALUES(" + column + ")")
+    hotel_id = room['hotel_id'] if room and room['hotel_id'] else 0
+    room_type = room['room_type'] if room and room['room_type'] else ''
+    DB.execute(sql, (day, hotel_id, room_type, amount), commit=True)
+
+
+def room_of_booking(booking_id):
+    b = DB.execute("SELECT room_id FROM bookings WHERE id=%s", (booking_id,), fetchone=True)
+    return REF_CACHE.get('rooms', b['room_id']) if b else None
+
+
+def rebuild_daily_revenue():
+    # payments and refunds are dated when they happened, as pay_invoice and
+    # cancel_booking add them. Amounts recorded before payments/cancelled_on
+    # existed have no date of their own and fall back to their booking's.
+    with DB.transaction():
+        DB.execute("DELETE FROM daily_revenue")
+        DB.execute(
+            "INSERT INTO daily_revenue (day, hotel_id, room_type, room_revenue) "
+            "SELECT COALESCE(DATE(b.check_out), DATE(b.check_in), CURDATE()), COALESCE(r.hotel_id,0), COALESCE(r.room_type,''), SUM(b.total_amount) "
+            "FROM bookings b LEFT JOIN rooms r ON r.id=b.room_id WHERE b.status='checked_out' GROUP BY 1, 2, 3")
+        DB.execute(
+            "INSERT INTO daily_revenue (day, hotel_id, room_type, payments) "
+            "SELECT day, hotel_id, room_type, SUM(amount) FROM ("
+            "SELECT COALESCE(DATE(p.pay_time), CURDATE()) AS day, COALESCE(r.hotel_id,0) AS hotel_id, COALESCE(r.room_type,'') AS room_type, p.amount "
+            "FROM payments p LEFT JOIN invoices i ON i.id=p.invoice_id LEFT JOIN bookings b ON b.id=i.booking_id LEFT JOIN rooms r ON r.id=b.room_id "
+            "UNION ALL "
+            "SELECT COALESCE(DATE(b.check_out), DATE(b.check_in), CURDATE()), COALESCE(r.hotel_id,0), COALESCE(r.room_type,''), "
+            "i.paid - COALESCE((SELECT SUM(p.amount) FROM payments p WHERE p.invoice_id=i.id), 0) "
+            "FROM invoices i LEFT JOIN bookings b ON b.id=i.booking_id LEFT JOIN rooms r ON r.id=b.room_id "
+            "WHERE i.paid > COALESCE((SELECT SUM(p.amount) FROM payments p WHERE p.invoice_id=i.id), 0)"
+            ") x GROUP BY day, hotel_id, room_type "
+            "ON DUPLICATE KEY UPDATE payments=VALUES(payments)")
+        DB.execute(
+            "INSERT INTO daily_revenue (day, hotel_id, room_type, refunds) "
+            "SELECT COALESCE(DATE(c.cancelled_on), DATE(b.check_in), CURDATE()), COALESCE(r.hotel_id,0), COALESCE(r.room_type,''), SUM(c.refund_amount) "
+            "FROM cancellations c LEFT JOIN bookings b ON b.id=c.booking_id LEFT JOIN rooms r ON r.id=b.room_id GROUP BY 1, 2, 3 "
+            "ON DUPLICATE KEY UPDATE refunds=VALUES(refunds)")
+        row = DB.execute("SELECT COUNT(*) AS c FROM daily_revenue", fetchone=True)
+    print("Rollup rebuilt:", row['c'], "rows")
+
+
+def revenue_by_hotel(start=None, end=None):
+    sql = ("SELECT h.name AS hotel, d.room_type, SUM(d.room_revenue) AS room, SUM(d.payments) AS paid, SUM(d.refunds) AS refunds "
+           "FROM daily_revenue d LEFT JOIN hotels h ON h.id=d.hotel_id "
+           "WHERE d.day >= COALESCE(%s, '1000-01-01') AND d.day <= COALESCE(%s, '9999-12-31') "
+           "GROUP BY d.hotel_id, h.name, d.room_type ORDER BY d.hotel_id, d.room_type")
+    return DB.execute(sql, (start or None, end or None), fetchall=True) or []
+
 # ==============================================================
 # Menus
 # ==============================================================
 
 def booking_menu():
     while True:
-        print("1.Create 2.List 3.CheckIn 4.CheckOut 5.Back")
+        print("1.Create 2.List 3.CheckIn 4.CheckOut 5.Find Room 6.Back")
         c = safe_input("Choice: ")
         if c == '1': create_booking()
         elif c == '2': list_bookings()
         elif c == '3': check_in()
         elif c == '4': check_out()
-        elif c == '5': break
+        elif c == '5': find_room()
+        elif c == '6': break
 
 
 def employee_menu():
@@ -515,11 +1068,12 @@ def cancellation_menu():
 
 def report_menu():
     while True:
-        print("1.Revenue 2.Occupancy 3.Back")
+        print("1.Revenue 2.Occupancy 3.Rebuild Revenue Rollup 4.Back")
         c = safe_input("Choice: ")
         if c == '1': report_revenue()
         elif c == '2': report_occupancy()
-        elif c == '3': break
+        elif c == '3': rebuild_daily_revenue()
+        elif c == '4': break
 
 # ==============================================================
 # Main Menu
@@ -548,9 +1102,12 @@ def main_menu():
         elif c == '12': cancellation_menu()
         elif c == '13': report_menu()
         elif c == '14': auth_menu()
-        elif c == '15': list_audit_logs()
+        elif c == '15':
+            list_audit_logs()
+            print_engine_stats()
         elif c == '16': logout()
         elif c == '17': break
+    LOG_WRITER.close()
 
 if __name__ == '__main__':
     main_menu()
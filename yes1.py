@@ -4,6 +4,9 @@
 # Class XII Section A, DPS Panipat Refinery
 # Technology: Python 3 + MySQL (mysql.connector only)
 
+import threading
+import time
+
 import mysql.connector
 from mysql.connector import errorcode
 
@@ -48,9 +51,21 @@ def safe_float(msg):
 # Database Engine
 # ======================================================
 
+# connections kept open between queries; a checkout blocks once all are in use
+POOL_SIZE = 5
+# an idle connection released less than this many seconds ago is handed out
+# without a ping round trip
+PING_AFTER = 1.0
+
+
 class Database:
-    def __init__(self, config):
+    def __init__(self, config, pool_size=POOL_SIZE):
         self.config = config
+        self.pool_size = pool_size
+        self.idle = []
+        self.opened = 0
+        self.lock = threading.Condition()
+        self.stats = {'checkouts': 0, 'waits': 0, 'handshakes': 0, 'handshakes_avoided': 0, 'reconnects': 0}
 
     def connect(self):
         try:
@@ -63,11 +78,83 @@ class Database:
             else:
                 raise RuntimeError(str(e))
 
+    def acquire(self):
+        with self.lock:
+            self.stats['checkouts'] += 1
+            if not self.idle and self.opened >= self.pool_size:
+                self.stats['waits'] += 1
+                while not self.idle and self.opened >= self.pool_size:
+                    self.lock.wait()
+            if self.idle:
+                conn, released = self.idle.pop()
+            else:
+                conn, released = None, 0
+                self.opened += 1
+        if conn is not None:
+            try:
+                if time.monotonic() - released > PING_AFTER:
+                    conn.ping(reconnect=False)
+                with self.lock:
+                    self.stats['handshakes_avoided'] += 1
+                return conn
+            except Exception:
+                # dead connection (server restart, wait_timeout): replace it
+                self.close_quietly(conn)
+                with self.lock:
+                    self.stats['reconnects'] += 1
+        try:
+            conn = self.connect()
+        except Exception:
+            with self.lock:
+                self.opened -= 1
+                self.lock.notify()
+            raise
+        with self.lock:
+            self.stats['handshakes'] += 1
+        return conn
+
+    def release(self, conn, discard=False):
+        if not discard:
+            try:
+                # never hand an open transaction (or read snapshot) to the next caller
+                if conn.in_transaction:
+                    conn.rollback()
+            except Exception:
+                discard = True
+        if discard:
+            self.close_quietly(conn)
+        with self.lock:
+            if discard:
+                self.opened -= 1
+            else:
+                self.idle.append((conn, time.monotonic()))
+            self.lock.notify()
+
+    def close_quietly(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def close_all(self):
+        with self.lock:
+            idle, self.idle = self.idle, []
+            self.opened -= len(idle)
+        for conn, _ in idle:
+            self.close_quietly(conn)
+
+    def pool_stats(self):
+        with self.lock:
+            stats = dict(self.stats)
+            stats['open'] = self.opened
+            stats['idle'] = len(self.idle)
+        return stats
+
     def execute(self, query, params=None, fetchone=False, fetchall=False, commit=False):
         conn = None
         try:
-            conn = self.connect()
-            cur = conn.cursor(dictionary=True)
+            conn = self.acquire()
+            cur = conn.cursor(dictionary=True, buffered=True)
             cur.execute(query, params or ())
             result = None
             if fetchone:
@@ -77,14 +164,17 @@ class Database:
             if commit:
                 conn.commit()
             cur.close()
-            conn.close()
+            self.release(conn)
             return result
         except Exception as e:
+            broken = False
             try:
                 if conn:
                     conn.rollback()
             except Exception:
-                pass
+                broken = True
+            if conn:
+                self.release(conn, discard=broken)
             print("Database error:", e)
             return None
 